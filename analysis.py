@@ -1,18 +1,23 @@
-from typing import List
-from habit import Habit
+from typing import Iterable, List
+from datetime import date, timedelta
+from itertools import accumulate, groupby
+from operator import itemgetter
+from habit import Habit, period_number
 
-def a1_print_all_habits(habits: List['Habit']):
+# Window lengths in days of the completion rates
+COMPLETION_RATE_WINDOWS = (7, 30, 90, 365)
+
+def a1_print_all_habits(habits: Iterable['Habit']):
     """Prints a record of all habits in the provided list.
 
     Args:
-        habits (List[Habits]): Contains a List of Habit objects
+        habits (Iterable[Habits]): Habit objects or records, e.g. a list or a stream from Habit.iter_records()
     """
-    if not habits:
-        print("No habits found.")
-        return
-    
-    print("\nHabit Records:")
+    found = False
     for habit in habits:
+        if not found:
+            print("\nHabit Records:")
+            found = True
         print("-----------------------------------")
         print(f"Habit id:       {habit.habit_id}")
         print(f"Name:           {habit.name}")
@@ -20,9 +25,12 @@ def a1_print_all_habits(habits: List['Habit']):
         print(f"Periodicity:    {habit.periodicity}")
         print(f"Creation Date:  {habit.creation_date}")
         print(f"Creation Time:  {habit.creation_time}")
-        print(f"Current Streak: {habit.current_streak}")
+        print(f"Current Streak: {habit.streak_as_of()}")
         print(f"Longest Streak: {habit.longest_streak}")
         print("-----------------------------------")
+    if not found:
+        print("No habits found.")
+        return
     print("\nEnd of Habit Records\n")
 
 def a1_print_habit(habit):
@@ -35,21 +43,17 @@ def a1_print_habit(habit):
         print(f"Periodicity:    {habit.periodicity}")
         print(f"Creation Date:  {habit.creation_date}")
         print(f"Creation Time:  {habit.creation_time}")
-        print(f"Current Streak: {habit.current_streak}")
+        print(f"Current Streak: {habit.streak_as_of()}")
         print(f"Longest Streak: {habit.longest_streak}")
         print("-----------------------------------")
         print("\nEnd of Habit Record\n")
 
-def a1_print_best_perfroming_habit(habits: List['Habit']):
+def a1_print_best_perfroming_habit(habits: Iterable['Habit']):
     """
     Print out the current best perfoming habit
 
-    :param habits (List[Habit]): List of all current habits
+    :param habits (Iterable[Habit]): all current habits
     """
-    if not habits:
-        print("No habits found. ")
-        return
-    
     best_performing_habit = []
     longest_streak= 0
 
@@ -61,7 +65,6 @@ def a1_print_best_perfroming_habit(habits: List['Habit']):
         elif streak == longest_streak:
             best_performing_habit.append(habit)
 
-
     if best_performing_habit:
         print("\nYour best performing habit(s) are: ")
         print("--------------------------------------")
@@ -72,25 +75,21 @@ def a1_print_best_perfroming_habit(habits: List['Habit']):
         print("\n")
         
     else:
-        print("\nYou have not completed a streak yet.")
+        print("No habits found. ")
 
-def a1_print_worst_performing_habit(habits: List['Habit']):
+def a1_print_worst_performing_habit(habits: Iterable['Habit']):
     """
     Print out the worst performing habit
 
     Args:
-        habits (List[Habit]): List of all current habits
+        habits (Iterable[Habit]): all current habits
     """
-    if not habits:
-        print("No habits found. ")
-        return
-    
     worst_performing_habit = []
-    shortest_streak= 0
+    shortest_streak= None
 
     for habit in habits:
-        streak = habit.longest_streak
-        if streak < shortest_streak:
+        streak = int(habit.longest_streak)
+        if shortest_streak is None or streak < shortest_streak:
             shortest_streak = streak
             worst_performing_habit = [(habit)]
         elif streak == shortest_streak:
@@ -105,6 +104,8 @@ def a1_print_worst_performing_habit(habits: List['Habit']):
 
         print("-----------------End------------------")
         print("\n")
+    else:
+        print("No habits found. ")
 
 def _transform_periodicity(streak, periodicity):
     """Helper function to print periodicities correctly
@@ -137,7 +138,7 @@ def _transform_periodicity(streak, periodicity):
             period = 'months'
     return period
 
-def a1_print_longest_streak(habits: List['Habit']):
+def a1_print_longest_streak(habits: Iterable['Habit']):
     """
     Prints out the longest streaks of all habits
 
@@ -158,26 +159,36 @@ def a1_print_longest_streak(habits: List['Habit']):
 
     print("----------------END----------------")
 
-def a1_print_habits_by_periodicity(habits: List['Habit'], wanted_periodicity: str):
+def a1_print_habits_by_periodicity(habits: Iterable['Habit'], wanted_periodicity: str):
     """
     Prints out all habits of a given periodicity
 
     Args:
-        habits (List[Habit]): List of all current habits
+        habits (Iterable[Habit]): all current habits
         wanted_periodicity (str): Either 'daily' or 'weekly'
     """
     if wanted_periodicity not in ('weekly','daily', 'monthly') :
         print("\nPlease enter either weekly, monthly or daily\n")
         return
     
-    filter_habits = [habit for habit in habits if habit.periodicity == wanted_periodicity]
+    filter_habits = [habit.name for habit in habits if habit.periodicity == wanted_periodicity]
+    a1_print_habit_names(filter_habits, wanted_periodicity)
 
+def a1_print_habit_names(names: List[str], wanted_periodicity: str):
+    """
+    Prints out the names of habits of a given periodicity, e.g. from a database query that
+    already filtered them
+
+    Args:
+        names (List[str]): names of the habits
+        wanted_periodicity (str): Either 'daily', 'weekly' or 'monthly'
+    """
     print(f"\nYour {wanted_periodicity} habits are: ")
     print("--------------------------------------")
     
-    if filter_habits:
-        for i, habit in enumerate(filter_habits, start=1):
-            print(f" {i}. {habit.name}")
+    if names:
+        for i, name in enumerate(names, start=1):
+            print(f" {i}. {name}")
     else:
         print(f"\nNo {wanted_periodicity} habits found.")
         
@@ -192,13 +203,98 @@ def a1_print_streaks(habit):
         habit (List): habit that should be displayed
     """
      
-    period_current = _transform_periodicity(habit.current_streak, habit.periodicity)
+    current_streak = habit.streak_as_of() # Stored streak may be outdated if the habit was abandoned
+    period_current = _transform_periodicity(current_streak, habit.periodicity)
     period_longest = _transform_periodicity(habit.longest_streak, habit.periodicity)
-    if habit.current_streak == 0:
+    if current_streak == 0:
         print("\nYou have not completed this habit yet. Try harder, you can do it!\n")
     else:
         print("--------------------------------------")
-        print(f"\nYour current streak of '{habit.name}' is {habit.current_streak} {period_current}.")
+        print(f"\nYour current streak of '{habit.name}' is {current_streak} {period_current}.")
         print(f"Your longest streak of '{habit.name}' is {habit.longest_streak} {period_longest} ")
         print("--------------------------------------")
 
+def a1_completion_rates(habits: Iterable['Habit'], completions, windows=COMPLETION_RATE_WINDOWS, as_of: date = None):
+    """Calculate rolling completion rates of all habits in one pass over the completion history.
+
+    A rate is the share of periods (days, weeks or months) within the last n days that were completed,
+    counted from the creation of the habit or its first completion if the window reaches further back.
+    For every habit a cumulative count (prefix sum) of completed periods is built once, after which
+    every window costs a single subtraction. Habits and completions are merged like two sorted streams,
+    so only the completions of one habit are held in memory at a time.
+
+    Args:
+        habits (Iterable[Habit]): habits to calculate the rates for ordered by id, e.g. from
+            Habit.iter_records()
+        completions (Iterable[tuple]): (habit_id, completed_date, ...) tuples ordered by habit id,
+            e.g. from HabitDatabase.db_iter_completions()
+        windows (tuple, optional): window lengths in days. Defaults to (7, 30, 90, 365).
+        as_of (date, optional): last day of the windows. Defaults to today.
+
+    Returns:
+        tuple: completion rates by window per habit id, and completion rates by window over all habits
+    """
+    as_of = as_of or date.today()
+    max_window = max(windows)
+    completions_by_habit = groupby(completions, key=itemgetter(0))
+    completions_id, habit_completions = next(completions_by_habit, (None, ()))
+
+    rates = {}
+    totals = {window: [0, 0] for window in windows} # completed and expected periods over all habits
+    for habit in habits:
+        habit_id = habit.habit_id
+        # Skip the completions of habits that are not in the stream
+        while completions_id is not None and completions_id < habit_id:
+            completions_id, habit_completions = next(completions_by_habit, (None, ()))
+        days = [completion[1] for completion in habit_completions] if completions_id == habit_id else ()
+
+        periodicity = habit.periodicity
+        last = period_number(as_of, periodicity)
+        completed = {period_number(day, periodicity) for day in days}
+        completed = {period for period in completed if period <= last}
+        first = min([period_number(date.fromisoformat(habit.creation_date), periodicity)] + list(completed))
+        if first > last: # Habit did not exist yet
+            continue
+
+        # The prefix sum only covers the longest window, older completions don't change any rate
+        origin = max(period_number(as_of - timedelta(days=max_window - 1), periodicity), first)
+        completed = {period for period in completed if period >= origin}
+        # prefix[i] is the number of completed periods before period origin + i
+        prefix = [0] + list(accumulate(1 if origin + i in completed else 0 for i in range(last - origin + 1)))
+
+        rates[habit_id] = {}
+        for window in windows:
+            start = max(period_number(as_of - timedelta(days=window - 1), periodicity), first)
+            completed_periods = prefix[last - origin + 1] - prefix[start - origin]
+            expected_periods = last - start + 1
+            rates[habit_id][window] = completed_periods / expected_periods
+            totals[window][0] += completed_periods
+            totals[window][1] += expected_periods
+
+    overall = {window: completed / expected if expected else 0.0 for window, (completed, expected) in totals.items()}
+    return rates, overall
+
+def a1_print_completion_rates(habits: Iterable['Habit'], rates, overall):
+    """Prints the completion rates of all habits as a report
+
+    Args:
+        habits (Iterable[Habit]): habits of the report
+        rates (dict): completion rates by window per habit id, see a1_completion_rates
+        overall (dict): completion rates by window over all habits
+    """
+    if not rates:
+        print("No habits found.")
+        return
+
+    windows = list(overall)
+    header = "".join(f"{f'{window} days':>10}" for window in windows)
+    print("\nYour completion rates are:")
+    print("--------------------------------------")
+    print(f"{'Habit':<30}{header}")
+    for habit in habits:
+        if habit.habit_id in rates:
+            habit_rates = "".join(f"{rates[habit.habit_id][window]:>10.0%}" for window in windows)
+            print(f"{habit.name[:29]:<30}{habit_rates}")
+    print(f"{'All habits':<30}" + "".join(f"{overall[window]:>10.0%}" for window in windows))
+    print("-----------------End------------------")
+    print("\n")
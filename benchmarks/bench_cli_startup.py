@@ -0,0 +1,88 @@
+"""Measures the cold start time of the CLI, one fresh interpreter per run.
+
+Every command is started with --help and with an unknown option, neither may open the database, a
+main.db in the working directory of the runs is reported as a regression. list and report are run
+against an empty database, which times a real invocation including opening the database.
+Exits with status 1 if the median of a command exceeds the startup budget.
+
+Usage: python benchmarks/bench_cli_startup.py --runs 20 --budget 250
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cli import cli
+
+
+def cold_start(arguments, directory: str, check: bool = False):
+    """Run the CLI in a new interpreter
+
+    Args:
+        arguments (list): command line arguments of the CLI
+        directory (str): working directory of the run
+        check (bool, optional): the command has to succeed. Defaults to False.
+
+    Raises:
+        subprocess.CalledProcessError: The command failed although check is set
+
+    Returns:
+        float: seconds until the process exited
+    """
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'cli.py'), *arguments],
+        cwd=directory, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=check
+        )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20, help='runs per command')
+    parser.add_argument('--budget', type=float, default=250, help='maximum median start time of a command in ms')
+    args = parser.parse_args()
+
+    cases = [['--help']]
+    for name in sorted(cli.commands):
+        cases += [[name, '--help'], [name, '--no-such-option']]
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, 'empty.db')
+        # Real invocations, the database is created before the runs so the migrations are not timed
+        invocations = [['--db', database, 'list'], ['--db', database, 'report']]
+        cold_start(invocations[0], directory, check=True)
+
+        # Start time of the bare interpreter for comparison
+        interpreter = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'pass'], cwd=directory)
+            interpreter.append(time.perf_counter() - start)
+        print(f"{'python -c pass':<40}{statistics.median(interpreter) * 1000:>8.1f} ms")
+
+        over_budget = []
+        for arguments in cases + invocations:
+            check = arguments in invocations
+            median = statistics.median(cold_start(arguments, directory, check) for _ in range(args.runs)) * 1000
+            label = ' '.join(arguments).replace(database, 'empty.db')
+            print(f"{label:<40}{median:>8.1f} ms")
+            if median > args.budget:
+                over_budget.append(label)
+
+        if os.path.exists(os.path.join(directory, 'main.db')):
+            print("Regression: starting the CLI without running a command created main.db")
+            sys.exit(1)
+        if over_budget:
+            print(f"Regression: start time over the budget of {args.budget:.0f} ms: {', '.join(over_budget)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
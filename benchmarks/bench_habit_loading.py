@@ -0,0 +1,83 @@
+"""Compares loading all habits as full Habit objects with loading them as read-only HabitRecords.
+
+Usage: python benchmarks/bench_habit_loading.py --habits 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from habit import Habit
+from habit_database import HabitDatabase
+
+
+def create_database(path: str, habits: int):
+    """Create a database with the given number of habits
+
+    Args:
+        path (str): path of the database file
+        habits (int): number of habits
+
+    Returns:
+        HabitDatabase: the database
+    """
+    db = HabitDatabase(path)
+    periodicities = ('daily', 'weekly', 'monthly')
+    with db.transaction():
+        db.db.executemany(
+            'INSERT INTO habit (name, description, periodicity, creation_date, creation_time) VALUES (?, ?, ?, ?, ?)',
+            ((f'habit {i}', f'description of habit {i}', periodicities[i % 3], '2024-01-01', '08:00:00') for i in range(habits))
+            )
+    return db
+
+
+def measure(load, runs: int = 3):
+    """Measure time and peak memory of loading all habits.
+    Tracing memory slows down allocations, so the time is measured in separate runs.
+
+    Args:
+        load (callable): loads and returns all habits
+        runs (int, optional): timed runs, the fastest one counts. Defaults to 3.
+
+    Returns:
+        tuple: seconds and peak memory in bytes
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        habits = load()
+        times.append(time.perf_counter() - start)
+        del habits
+
+    tracemalloc.start()
+    habits = load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del habits
+    return min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--habits', type=int, default=1_000_000, help='number of habits')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = create_database(os.path.join(directory, 'bench.db'), args.habits)
+        results = {
+            'Habit.get_all_habits': measure(lambda: Habit.get_all_habits(db)),
+            'Habit.get_all_records': measure(lambda: Habit.get_all_records(db)),
+        }
+        db.db_close()
+
+    print(f"Loading {args.habits} habits")
+    for name, (seconds, peak) in results.items():
+        print(f"{name:<24}{seconds:>8.2f} s{peak / 2**20:>10.1f} MiB peak")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Measures the bulk ingest of completions with Habit.record_completions(), into new habits and as a
+second batch that continues their streaks.
+
+Usage: python benchmarks/bench_record_completions.py --completions 100000 --habits 100
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from habit import Habit
+from habit_database import HabitDatabase
+
+
+def create_habits(db: HabitDatabase, habits: int):
+    """Create habits of all periodicities
+
+    Args:
+        db (HabitDatabase): database of the habits
+        habits (int): number of habits
+
+    Returns:
+        list: habit ids
+    """
+    periodicities = ('daily', 'weekly', 'monthly')
+    with db.transaction():
+        for i in range(habits):
+            Habit(name=f'habit {i}', description='', periodicity=periodicities[i % 3], creation_date='2000-01-01', db=db).save()
+    return [habit.habit_id for habit in Habit.get_all_records(db)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--completions', type=int, default=100_000, help='completions per batch')
+    parser.add_argument('--habits', type=int, default=100, help='number of habits')
+    args = parser.parse_args()
+
+    today = date.today()
+    days = args.completions // args.habits
+    with tempfile.TemporaryDirectory() as directory:
+        db = HabitDatabase(os.path.join(directory, 'bench.db'))
+        habit_ids = create_habits(db, args.habits)
+        # The older half of the history first, then the newer half
+        for name, offsets in (('new habits', range(2 * days - 1, days - 1, -1)), ('continued streaks', range(days - 1, -1, -1))):
+            completions = [
+                (habit_id, str(today - timedelta(days=offset)), '07:30:00') for habit_id in habit_ids for offset in offsets
+                ]
+            start = time.perf_counter()
+            Habit.record_completions(completions, db)
+            print(f"{name:<24}{len(completions):>10} completions{time.perf_counter() - start:>8.2f} s")
+        db.db_close()
+
+
+if __name__ == '__main__':
+    main()
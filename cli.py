@@ -2,18 +2,44 @@
 #CLI
 
 import click
-from habit_database import HabitDatabase
-from habit import Habit
+from contextlib import contextmanager, redirect_stdout
 from datetime import date, datetime
-import analysis
+import json
 import sys
 
-db = HabitDatabase()
+# Set by _load_app() when a command needs them, so --help and argument errors never open the database
+db = None
+# Habits of the session, screens read them from memory until the database changes
+session = None
+# Application modules, imported by _load_app()
+Habit = HabitRecord = analysis = None
+
+# Habits listed per page when a habit is chosen
+HABITS_PER_PAGE = 20
 
 @click.group()
-def cli():
+@click.option('--db', 'db_name', default='main.db', show_default=True, help="Database file")
+@click.pass_context
+def cli(ctx, db_name):
     """Habit Tracker CLI"""
-    click.echo("\n-------Welcome to the Habit Tracker App-------\n")
+    ctx.obj = db_name # Opened by the commands, not here
+
+def _load_app(db_name: str = "main.db"):
+    """Import the application modules and open the shared database on first use
+
+    Args:
+        db_name (str, optional): database file. Defaults to "main.db".
+    """
+    global db, session, Habit, HabitRecord, analysis
+    if db is not None and db.db_name == db_name:
+        return
+    from habit_database import HabitDatabase
+    from habit import Habit, HabitRecord
+    from habit_cache import HabitSessionCache
+    import analysis
+
+    db = HabitDatabase.shared(db_name)
+    session = HabitSessionCache(db, lambda row: HabitRecord(*row, db))
 
 def exit_app():
     """Exit Application"""
@@ -26,58 +52,102 @@ def cli_add_habit():
         habit_name = click.prompt("Please enter a habit name ", type=str)
         habit_periodicity = click.prompt("Please choose between daily, weekly or monthly habit", type=str)
       
-        if Habit.is_duplicate(habit_name, habit_periodicity):
+        if Habit.is_duplicate(habit_name, habit_periodicity, db):
             click.echo("\nA habit with this name and periodicity already exists. Please try again")
             continue
         
         habit_description = click.prompt("Please give a short description", type=str)
-        habit = Habit(name = habit_name, description = habit_description, periodicity = habit_periodicity)
+        habit = Habit(name = habit_name, description = habit_description, periodicity = habit_periodicity, db = db)
         habit.save()
+        session.invalidate(habit.habit_id)
         click.echo(f"\n-----Habit '{habit.name}' added successfully-----")
 
         if not click.confirm("\nWould you like to add another habit?", default = False):
             click.echo("\n-----Exiting - Returning to Analytics Menu------")
             break
 
+def _cli_choose_habit(message: str):
+    """List the habits one page at a time and prompt for the id of a habit until an existing habit
+    is entered. Only the ids and names of the shown page are read from the database.
+
+    Args:
+        message (str): prompt shown to the user
+
+    Returns:
+        Habit: the chosen habit, None if there are no habits
+    """
+    page_starts = [0] # Last id before each visited page, to go back without OFFSET
+    name_prefix = None
+    while True:
+        page = db.db_get_habit_page(page_starts[-1], HABITS_PER_PAGE + 1, name_prefix, columns=('id', 'name'))
+        has_next = len(page) > HABITS_PER_PAGE
+        page = page[:HABITS_PER_PAGE]
+        if not page and not name_prefix and len(page_starts) == 1:
+            return None
+
+        click.echo("\nHere are your current habits:" if not name_prefix else f"\nHabits starting with '{name_prefix}':")
+        click.echo("----------------------------------")
+        for habit_id, name in page:
+            click.echo(f"Habit id: {habit_id}, Name: {name}")
+        if not page:
+            click.echo("No habits found.")
+        click.echo("----------------------------------")
+        options = ["f to filter by name"]
+        if len(page_starts) > 1:
+            options.insert(0, "p for the previous page")
+        if has_next:
+            options.insert(0, "n for the next page")
+
+        choice = click.prompt(f"{message} ({', '.join(options)})", type=str).strip()
+        if choice.lower() == 'n' and has_next:
+            page_starts.append(page[-1][0])
+        elif choice.lower() == 'p' and len(page_starts) > 1:
+            page_starts.pop()
+        elif choice.lower() == 'f':
+            name_prefix = click.prompt("Show habits whose name starts with (Enter for all habits)", default='', show_default=False) or None
+            page_starts = [0]
+        else:
+            try:
+                habit_id = int(choice)
+            except ValueError:
+                print(f"\nInvalid input '{choice}'. Please try again.")
+                continue
+            try:
+                return Habit.get_by_id(habit_id, db) # A single query, or none if the habit is cached
+            except ValueError:
+                print(f"\nHabit with id {habit_id} doesn't exist. Please try again.")
+
 def cli_update_habit():
     """Function to update a habit"""
     while True:
-        habits = Habit.get_all_habits()
-
-        if not habits:
+        habit = _cli_choose_habit("\nPlease enter the id of the habit you like to change")
+        if habit is None:
             click.echo("\nNo habits found. Please add a habit first.")
             return
-        
-        click.echo("\nHere are your current habits:")
-        click.echo("----------------------------------")
-        for habit in habits:
-            click.echo(f"Habit id: {habit.habit_id}, Name: {habit.name}")
-
-        while True:
-            habit_id = click.prompt("\nPlease enter the id of the habit you like to change", type=int)
-            if Habit.habit_exists(habit_id):
-                break
-            else:
-                print(f"\nHabit with id {habit_id} doesn't exist. Please try again.")
 
-        for habit in habits:
-            if habit.habit_id == habit_id:
-                if click.confirm("\nWould you like to change the name of the habit? Enter yes or no "):
-                    new_name = click.prompt("Please enter the new name", type=str)
-                    habit.update(name = new_name)
-                if click.confirm("\nWould you like to change the description? Enter yes or no"):
-                    new_description = click.prompt("Please enter the new description", type=str)
-                    habit.update(description = new_description)
-                if click.confirm("\nWould you like to change the periodicity? Enter yes or no"):
-                    while True:
-                        new_periodicity = click.prompt("Please enter the new periodicity", type=str)
-                        valid_periodicities={'daily', 'weekly', 'monthly'}
-                        if new_periodicity in valid_periodicities:
-                            habit.update(periodicity = new_periodicity)
-                            break
-                        else:
-                            click.echo("Please enter a correct periodicity: 'daily', 'weekly' or 'monthly")
-                analysis.a1_print_habit(habit)
+        if click.confirm("\nWould you like to change the name of the habit? Enter yes or no "):
+            new_name = click.prompt("Please enter the new name", type=str)
+            try:
+                habit.update(name = new_name)
+            except ValueError as e:
+                click.echo(f"\n{e} The name was not changed.")
+        if click.confirm("\nWould you like to change the description? Enter yes or no"):
+            new_description = click.prompt("Please enter the new description", type=str)
+            habit.update(description = new_description)
+        if click.confirm("\nWould you like to change the periodicity? Enter yes or no"):
+            while True:
+                new_periodicity = click.prompt("Please enter the new periodicity", type=str)
+                valid_periodicities={'daily', 'weekly', 'monthly'}
+                if new_periodicity in valid_periodicities:
+                    try:
+                        habit.update(periodicity = new_periodicity)
+                    except ValueError as e:
+                        click.echo(f"\n{e} The periodicity was not changed.")
+                    break
+                else:
+                    click.echo("Please enter a correct periodicity: 'daily', 'weekly' or 'monthly")
+        session.invalidate(habit.habit_id)
+        analysis.a1_print_habit(habit)
         
         if not click.confirm("\nWould you like update other habits?", default =False):
             click.echo("\n-----Exiting - Returning to Main Menu------")
@@ -86,30 +156,20 @@ def cli_update_habit():
 def cli_delete_habit():
         print("Inside delete habit cli")
         while True:
-            habits = Habit.get_all_habits()
-            if not habits:
+            #Display the habits to choose from and enter the id of the habit
+            habit = _cli_choose_habit("\nPlease enter the id of the habit you would like to delete")
+            if habit is None:
                 click.echo("\nNo habits found. Please add a habit first.")
                 return
-            #Display the habits to choose from
-            click.echo("\nHere are your current habits:")
-            for habit in habits:
-                click.echo(f"Habit id: {habit.habit_id}, Name: {habit.name}")
-            # Enter the id of the habit that was completed and check if it exists
-            while True:
-                habit_id = click.prompt("\nPlease enter the id of the habit you would like to delete", type=int) 
-                if Habit.habit_exists(habit_id):
-                    break
-                else:
-                    print(f"\nHabit with id {habit_id} doesn't exist. Please try again.")
-            Habit.delete_habit(habit_id)
+            Habit.delete_habit(habit.habit_id, db)
+            session.invalidate(habit.habit_id)
             
             if not click.confirm("Would you like to delete another habit?", default =False):
                 click.echo("\n-----Exiting - Returning to Main Menu------")
                 break
 def cli_print_all_habits():
     """Function that prints all saved habits"""
-    habits = Habit.get_all_habits()
-    analysis.a1_print_all_habits(habits)
+    analysis.a1_print_all_habits(session.habits())
 
     click.prompt("Please press Enter to return to the Menu", default='', show_default= False)
 
@@ -117,21 +177,11 @@ def cli_mark_habit_completed():
     """Function to mark a habit as completed"""
     # Get all habits and check that the List is not empty
     while True:
-        habits = Habit.get_all_habits()
-        if not habits:
+        #Display the habits to choose from and enter the id of the habit that was completed
+        habit = _cli_choose_habit("\nPlease enter the id of the habit you would like to mark as completed")
+        if habit is None:
             click.echo("\nNo habits found. Please add a habit first.")
             return
-        #Display the habits to choose from
-        click.echo("\nHere are your current habits:")
-        for habit in habits:
-            click.echo(f"Habit id: {habit.habit_id}, Name: {habit.name}")
-        # Enter the id of the habit that was completed and check if it exists
-        while True:
-            habit_id = click.prompt("\nPlease enter the id of the habit you would like to mark as completed", type=int) 
-            if Habit.habit_exists(habit_id):
-                break
-            else:
-                print(f"\nHabit with id {habit_id} doesn't exist. Please try again.")
 
         while True:       
             cli_completed_date = click.prompt("Enter the completion date (YYYY-MM-DD) or press Enter to use today's date", default=str(date.today()))
@@ -151,9 +201,8 @@ def cli_mark_habit_completed():
                 print("Wrong time format. Please enter hh:mm:ss")
 
      
-        for habit in habits:
-            if habit.habit_id == habit_id:
-                habit.record_completion(completed_date = cli_completed_date, completed_time = cli_completed_time)
+        habit.record_completion(completed_date = cli_completed_date, completed_time = cli_completed_time)
+        session.invalidate(habit.habit_id)
        
         if not click.confirm("Would you like to mark another habit as completed?", default =False):
             click.echo("\n-----Exiting - Returning to Main Menu------")
@@ -161,14 +210,14 @@ def cli_mark_habit_completed():
 
 def cli_print_best_performing():
     """Function to print the habits with the longest streak"""
-    habits = Habit.get_all_habits()
+    habits = Habit.get_top_habits(db=db)
     analysis.a1_print_best_perfroming_habit(habits)
 
     click.prompt("Please press Enter to return to the Menu", default='', show_default= False)
         
 def cli_print_worst_performing():
     """Function to print the habits with the shortest streak"""
-    habits = Habit.get_all_habits()
+    habits = Habit.get_bottom_habits(db=db)
     analysis.a1_print_worst_performing_habit(habits)
 
     click.prompt("Please press Enter to return to the Menu", default='', show_default= False)
@@ -176,20 +225,10 @@ def cli_print_worst_performing():
 def cli_print_habit():
     """Function to print a specific habit"""
     while True:
-        habits = Habit.get_all_habits()
-
-        click.echo("\nHere are your current habits:")
-        for habit in habits:
-            click.echo(f"Habit id: {habit.habit_id}, Name: {habit.name}")
-        
-        while True:
-            habit_id = click.prompt("\nPlease enter the id of the habit you would like to view", type=int) 
-            if Habit.habit_exists(habit_id):
-                break
-            else:
-                print(f"\nHabit with id {habit_id} doesn't exist. Please try again.")
-
-        habit = Habit.get_by_id(habit_id)
+        habit = _cli_choose_habit("\nPlease enter the id of the habit you would like to view")
+        if habit is None:
+            click.echo("\nNo habits found. Please add a habit first.")
+            return
         analysis.a1_print_habit(habit)
 
         if not click.confirm("Would you like to view another habit?"):
@@ -215,41 +254,41 @@ def cli_print_periodicity():
 
 def _cli_print_daily_habits():
     """Helper function that prints out daily habits"""
-    habits = Habit.get_all_habits()
-    analysis.a1_print_habits_by_periodicity(habits,'daily')
+    _cli_print_habits_by_periodicity('daily')
     
 def _cli_print_weekly_habits():
     """ Helper function that prints out weekly habits"""
-    habits = Habit.get_all_habits()
-    analysis.a1_print_habits_by_periodicity(habits,'weekly')
+    _cli_print_habits_by_periodicity('weekly')
 
 def _cli_print_monthly_habits():
     """Helper function that prints out weekly habits"""
-    habits = Habit.get_all_habits()
-    analysis.a1_print_habits_by_periodicity(habits, 'monthly')
+    _cli_print_habits_by_periodicity('monthly')
+
+def _cli_print_habits_by_periodicity(periodicity):
+    """Helper function that prints out the habits of a periodicity from the session cache"""
+    names = [habit.name for habit in session.habits() if habit.periodicity == periodicity]
+    analysis.a1_print_habit_names(names, periodicity)
+
 def cli_print_all_longest_streaks():
     """Print longest streaks of all habits
     """
-    habits = Habit.get_all_habits()
-    analysis.a1_print_longest_streak(habits)
+    analysis.a1_print_longest_streak(session.habits())
 
-def cli_print_habit_streaks():
+def cli_print_completion_rates():
+    """Print the 7, 30, 90 and 365 day completion rates of all habits"""
+    habits = session.habits()
+    rates, overall = analysis.a1_completion_rates(habits, db.db_iter_completions())
+    analysis.a1_print_completion_rates(habits, rates, overall)
 
-    while True:
-        habits = Habit.get_all_habits()
+    click.prompt("Please press Enter to return to the Menu", default='', show_default= False)
 
-        click.echo("\nHere are your current habits:")
-        for habit in habits:
-            click.echo(f"Habit id: {habit.habit_id}, Name: {habit.name}")
-        
-        while True:
-            habit_id = click.prompt("\nPlease enter the id of the habit you would like to view", type=int) 
-            if Habit.habit_exists(habit_id):
-                break
-            else:
-                print(f"\nHabit with id {habit_id} doesn't exist. Please try again.")
+def cli_print_habit_streaks():
 
-        habit = Habit.get_by_id(habit_id)
+    while True:
+        habit = _cli_choose_habit("\nPlease enter the id of the habit you would like to view")
+        if habit is None:
+            click.echo("\nNo habits found. Please add a habit first.")
+            return
         analysis.a1_print_streaks(habit)
 
         if not click.confirm("Would you like to view another habit?"):
@@ -257,8 +296,11 @@ def cli_print_habit_streaks():
             break
 
 @cli.command()
-def main_menu():
+@click.pass_obj
+def main_menu(db_name):
     """Start Main Menu for managing habits"""
+    _load_app(db_name)
+    click.echo("\n-------Welcome to the Habit Tracker App-------\n")
     while True:
             click.echo("\n_____Main MENU_____")
             click.echo("\nWhat would you like to do?")
@@ -306,10 +348,11 @@ def analysation_mode():
                     click.echo("    5. View habits based on periodicity")
                     click.echo("    6. View streak data of a habit")
                     click.echo("    7. View all my longest streaks")
-                    click.echo("    8. Return to main menu")
-                    click.echo("    9. Exit\n")
+                    click.echo("    8. View completion rates")
+                    click.echo("    9. Return to main menu")
+                    click.echo("    10. Exit\n")
 
-                    choice_2 = click.prompt("Please enter your choice (1-9)", type=int)
+                    choice_2 = click.prompt("Please enter your choice (1-10)", type=int)
                     
                     if choice_2 == 1:
 
@@ -337,14 +380,221 @@ def analysation_mode():
                         cli_print_all_longest_streaks()
                     
                     elif choice_2 == 8:
+                        cli_print_completion_rates()
+
+                    elif choice_2 == 9:
                         return
                     
-                    elif choice_2 == 9:
+                    elif choice_2 == 10:
                         exit_app()
 
                     else:
-                        click.echo("Invalid choice. Please enter a number between 1 and 6.")
+                        click.echo("Invalid choice. Please enter a number between 1 and 10.")
                         continue
 
+@contextmanager
+def _batch(db_name: str):
+    """Run the work of a non-interactive command against the database in one transaction.
+    Messages printed by the habit modules go to stderr, so stdout only carries the JSON output.
+    Invalid input rolls back the whole transaction and ends the command with an error.
+
+    Args:
+        db_name (str): database file
+    """
+    _load_app(db_name)
+    try:
+        with redirect_stdout(sys.stderr), db.transaction():
+            yield
+    except ValueError as e:
+        raise click.ClickException(str(e).strip()) from e
+
+def _read_records(file):
+    """Read JSON records, one object per line, empty lines are skipped
+
+    Args:
+        file (file): open text file, e.g. stdin
+
+    Yields:
+        dict: records
+    """
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {number} is not a JSON object")
+        yield record
+
+@cli.command()
+@click.argument('name', required=False)
+@click.option('--description', default='', help="Description of the habit")
+@click.option('--periodicity', type=click.Choice(['daily', 'weekly', 'monthly']), help="Periodicity of the habit")
+@click.option('--file', 'records', type=click.File('r'),
+              help="JSON lines with name, description, periodicity and optional creation_date and creation_time, - for stdin")
+@click.pass_obj
+def add(db_name, name, description, periodicity, records):
+    """Add a habit, or all habits of a file"""
+    if (name is None) == (records is None):
+        raise click.UsageError("Give either a NAME or --file")
+    records = _read_records(records) if records else [{'name': name, 'description': description, 'periodicity': periodicity}]
+    added = []
+    today = date.today()
+    with _batch(db_name):
+        for number, record in enumerate(records, start=1):
+            # Same rules as completion dates and times, so only valid and zero padded values are stored
+            try:
+                creation_date, creation_time = Habit._validate_completion(
+                    record.get('creation_date'), record.get('creation_time'), today
+                    )
+            except (ValueError, TypeError, AttributeError) as e:
+                raise ValueError(f"Invalid creation date or time of habit {number}: {e}")
+            # JSON values can be of any type, anything but text would only fail in the database
+            fields = {'name': record.get('name'), 'description': record.get('description', ''), 'periodicity': record.get('periodicity')}
+            for field, value in fields.items():
+                if not isinstance(value, str):
+                    raise ValueError(f"Invalid {field} of habit {number}: expected a string, got {json.dumps(value)}")
+            habit = Habit(
+                name=fields['name'],
+                description=fields['description'],
+                periodicity=fields['periodicity'],
+                creation_date=str(creation_date),
+                creation_time=str(creation_time),
+                db=db
+                )
+            habit.save()
+            added.append({'id': habit.habit_id, 'name': habit.name, 'periodicity': habit.periodicity})
+    click.echo(json.dumps({'added': added}))
+
+@cli.command()
+@click.argument('habit_ids', nargs=-1, type=int)
+@click.option('--date', 'completed_date', help="Completion date YYYY-MM-DD. Defaults to today.")
+@click.option('--time', 'completed_time', help="Completion time hh:mm:ss. Defaults to now.")
+@click.option('--file', 'records', type=click.File('r'),
+              help="JSON lines with habit_id and optional completed_date and completed_time, - for stdin")
+@click.pass_obj
+def complete(db_name, habit_ids, completed_date, completed_time, records):
+    """Mark habits as completed, duplicates are skipped"""
+    if bool(habit_ids) == (records is not None):
+        raise click.UsageError("Give either HABIT_IDS or --file")
+    with _batch(db_name):
+        if records:
+            completions = [
+                (record.get('habit_id'), record.get('completed_date'), record.get('completed_time'))
+                for record in _read_records(records)
+                ]
+        else:
+            completions = [(habit_id, completed_date, completed_time) for habit_id in habit_ids]
+        recorded = Habit.record_completions(completions, db)
+    click.echo(json.dumps({'recorded': recorded, 'skipped': len(completions) - recorded}))
+
+@cli.command()
+@click.argument('habit_ids', nargs=-1, type=int, required=True)
+@click.option('--name', help="New name")
+@click.option('--description', help="New description")
+@click.option('--periodicity', type=click.Choice(['daily', 'weekly', 'monthly']), help="New periodicity")
+@click.pass_obj
+def update(db_name, habit_ids, name, description, periodicity):
+    """Update the name, description or periodicity of habits"""
+    if not (name or description or periodicity):
+        raise click.UsageError("Give at least one of --name, --description or --periodicity")
+    with _batch(db_name):
+        for habit_id in habit_ids:
+            Habit.get_by_id(habit_id, db).update(name=name, description=description, periodicity=periodicity)
+    click.echo(json.dumps({'updated': list(habit_ids)}))
+
+@cli.command()
+@click.argument('habit_ids', nargs=-1, type=int, required=True)
+@click.pass_obj
+def delete(db_name, habit_ids):
+    """Delete habits and their completions"""
+    with _batch(db_name):
+        for habit_id in habit_ids:
+            Habit.delete_habit(habit_id, db)
+    click.echo(json.dumps({'deleted': list(habit_ids)}))
+
+@cli.command(name='list')
+@click.option('--periodicity', type=click.Choice(['daily', 'weekly', 'monthly']), help="Only habits of this periodicity")
+@click.option('--prefix', help="Only habits whose name starts with it")
+@click.pass_obj
+def list_habits(db_name, periodicity, prefix):
+    """List habits as JSON lines, one habit per line"""
+    _load_app(db_name)
+    # Read page by page, memory does not grow with the number of habits
+    after_id = 0
+    while True:
+        page = db.db_get_habit_page(after_id, 1000, prefix, periodicity=periodicity)
+        if not page:
+            break
+        for row in page:
+            click.echo(json.dumps(dict(zip(HabitRecord._fields, row)))) # Columns without the database
+        after_id = page[-1][0]
+
+@cli.command()
+@click.argument('habit_ids', nargs=-1, type=int)
+@click.option('--as-of', type=click.DateTime(formats=['%Y-%m-%d']), help="Date of the report YYYY-MM-DD. Defaults to today.")
+@click.pass_obj
+def report(db_name, habit_ids, as_of):
+    """Report the streaks and completion rates of all habits, or of the given habits, as JSON"""
+    _load_app(db_name)
+    as_of = as_of.date() if as_of else date.today()
+    wanted = set(habit_ids)
+    with redirect_stdout(sys.stderr):
+        habits = [habit for habit in session.habits() if not wanted or habit.habit_id in wanted]
+        missing = wanted - {habit.habit_id for habit in habits}
+        if missing:
+            raise click.ClickException(f"Habits with ids {sorted(missing)} do not exist")
+        rates, overall = analysis.a1_completion_rates(habits, db.db_iter_completions(), as_of=as_of)
+        habit_reports = [
+            {
+                'id': habit.habit_id,
+                'name': habit.name,
+                'periodicity': habit.periodicity,
+                'current_streak': habit.streak_as_of(as_of, db),
+                'longest_streak': habit.longest_streak,
+                'completion_rates': rates.get(habit.habit_id, {}),
+            }
+            for habit in habits
+            ]
+    click.echo(json.dumps({'as_of': str(as_of), 'overall': overall, 'habits': habit_reports}))
+
+@cli.command(name='import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help="File format. Defaults to the file extension.")
+@click.option('--source', help="Name of the import, identifies its checkpoint. Defaults to the path, size and modification time of the file.")
+@click.option('--batch-size', type=click.IntRange(min=1), default=10000, show_default=True, help="Records per transaction")
+@click.option('--restart', is_flag=True, help="Ignore the checkpoint and start from the first record")
+@click.pass_obj
+def import_habits(db_name, path, fmt, source, batch_size, restart):
+    """Import habits and completions from a CSV or JSON lines file.
+    An interrupted import continues after the last committed batch when it is run again."""
+    _load_app(db_name)
+    import habit_import
+    try:
+        with redirect_stdout(sys.stderr):
+            stats = habit_import.import_file(db, path, source, fmt, batch_size, restart)
+    except ValueError as e:
+        raise click.ClickException(str(e).strip()) from e
+    click.echo(json.dumps(stats))
+
+@cli.command(name='export')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl', 'npy']), default='csv', show_default=True,
+              help="csv and jsonl write habits and completions files, npy a directory with one file per column")
+@click.option('--habit-id', 'habit_ids', type=int, multiple=True, help="Only this habit, can be repeated")
+@click.option('--periodicity', type=click.Choice(['daily', 'weekly', 'monthly']), help="Only habits of this periodicity")
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help="Only completions on or after this date")
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help="Only completions on or before this date")
+@click.pass_obj
+def export_data(db_name, directory, fmt, habit_ids, periodicity, start, end):
+    """Export habits with their streak data and all completions into a directory"""
+    _load_app(db_name)
+    import habit_export
+    with redirect_stdout(sys.stderr):
+        counts = habit_export.export_all(
+            db, directory, fmt, habit_ids or None, periodicity,
+            start.date() if start else None, end.date() if end else None
+            )
+    click.echo(json.dumps(counts))
+
 if __name__ == '__main__':
     cli()
\ No newline at end of file
@@ -0,0 +1,136 @@
+from datetime import date
+
+
+class CompletionBitmap:
+
+    def __init__(self, origin: int, bits: int = 0):
+        """Compact record of the days a habit was completed, one bit per day.
+        Bit 0 stands for the origin day, usually the creation date of the habit. A decade of daily
+        history fits into less than 500 bytes.
+
+        Args:
+            origin (int): day ordinal (date.toordinal()) of bit 0
+            bits (int, optional): completed days as bits of an integer. Defaults to 0.
+        """
+        self.origin = origin
+        self.bits = bits
+
+    @classmethod
+    def from_blob(cls, origin: int, blob: bytes):
+        """Create a bitmap from its stored form
+
+        Args:
+            origin (int): day ordinal of bit 0
+            blob (bytes): little endian bits, None for an empty bitmap
+
+        Returns:
+            CompletionBitmap: the bitmap
+        """
+        return cls(origin, int.from_bytes(blob or b'', 'little'))
+
+    def to_blob(self):
+        """Get the stored form of the bitmap
+
+        Returns:
+            bytes: little endian bits
+        """
+        return self.bits.to_bytes((self.bits.bit_length() + 7) // 8, 'little')
+
+    def add(self, day: date):
+        """Mark a day as completed. Days before the origin move the origin back.
+
+        Args:
+            day (date): completed day
+        """
+        ordinal = day.toordinal()
+        if ordinal < self.origin:
+            self.bits <<= self.origin - ordinal
+            self.origin = ordinal
+        self.bits |= 1 << (ordinal - self.origin)
+
+    def __contains__(self, day: date):
+        """Check if the habit was completed on a day
+
+        Args:
+            day (date): day to check
+
+        Returns:
+            bool: True if the day was completed
+        """
+        position = day.toordinal() - self.origin
+        return position >= 0 and (self.bits >> position) & 1 == 1
+
+    def count(self, start: date, end: date):
+        """Count the completed days in a date range
+
+        Args:
+            start (date): first day of the range
+            end (date): last day of the range, included
+
+        Returns:
+            int: number of completed days
+        """
+        first = max(start.toordinal() - self.origin, 0)
+        last = end.toordinal() - self.origin
+        if last < first:
+            return 0
+        window = (self.bits >> first) & ((1 << (last - first + 1)) - 1)
+        return bin(window).count("1")
+
+    def last_completed(self):
+        """Get the most recent completed day
+
+        Returns:
+            date: most recent completed day, None if the habit was never completed
+        """
+        if not self.bits:
+            return None
+        return date.fromordinal(self.origin + self.bits.bit_length() - 1)
+
+    def run_ending_at(self, day: date):
+        """Length of the run of consecutive completed days that ends on a day
+
+        Args:
+            day (date): last day of the run
+
+        Returns:
+            int: number of consecutive completed days up to and including the day
+        """
+        position = day.toordinal() - self.origin
+        if position < 0:
+            return 0
+        # The highest missed day at or before the position ends the run
+        missed = ~self.bits & ((1 << (position + 1)) - 1)
+        if not missed:
+            return position + 1
+        return position - (missed.bit_length() - 1)
+
+    def longest_run(self):
+        """Length of the longest run of consecutive completed days.
+        Every step of `bits & (bits >> 1)` shortens all runs by one day, so the number of steps
+        until no bit is left is the length of the longest run.
+
+        Returns:
+            int: longest run of completed days
+        """
+        bits = self.bits
+        longest = 0
+        while bits:
+            bits &= bits >> 1
+            longest += 1
+        return longest
+
+    def days(self):
+        """Iterate over all completed days in date order
+
+        Yields:
+            date: completed days
+        """
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            yield date.fromordinal(self.origin + lowest.bit_length() - 1)
+            bits ^= lowest
+
+    def __len__(self):
+        return bin(self.bits).count("1")
@@ -1,6 +1,136 @@
 
 from habit_database import HabitDatabase
-from datetime import date, datetime, timedelta
+from habit_cache import LRUCache
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+
+# Effective current streaks by (database, habit, periodicity, date, data version), see Habit.streak_as_of()
+_streak_cache = LRUCache(maxsize=4096)
+
+
+def period_number(day: date, periodicity: str):
+    """Get the number of the period (day, week or month) a date lies in.
+    Consecutive periods have consecutive numbers.
+
+    Args:
+        day (date): given date
+        periodicity (str): daily, weekly or monthly
+
+    Returns:
+        int: day ordinal, ordinal of the week's Monday divided by 7 or year * 12 + month - 1
+    """
+    if periodicity == 'daily':
+        return day.toordinal()
+    if periodicity == 'weekly':
+        return (day - timedelta(days=day.weekday())).toordinal() // 7 # Mondays are 7 days apart
+    return day.year * 12 + day.month - 1
+
+
+def streak_from_run(periodicity: str, last_period: int, run: int, as_of: date = None):
+    """Get the current streak from the most recent run of completed periods.
+    Daily and weekly streaks are only current if the habit was completed in the current period.
+    Monthly streaks are also current in the month after the last completed month, as the current
+    month may still be completed. They go stale once a whole month was missed.
+
+    Args:
+        periodicity (str): daily, weekly or monthly
+        last_period (int): most recent period the habit was completed in
+        run (int): length of the run of consecutive periods that ends in last_period
+        as_of (date, optional): date the streak is evaluated for. Defaults to today.
+
+    Returns:
+        int: current streak
+    """
+    current_period = period_number(as_of or date.today(), periodicity)
+    if last_period == current_period or (periodicity == 'monthly' and last_period == current_period - 1):
+        return run
+    return 0
+
+
+class HabitRecord(NamedTuple):
+    """Read-only row of the habit table for listings and analytics.
+    A plain tuple with the database it was read from, so loading many habits is cheap. Use to_habit()
+    to get a Habit that can be changed and saved.
+    """
+    habit_id: int
+    name: str
+    description: str
+    periodicity: str
+    creation_date: str
+    creation_time: str
+    longest_streak: int
+    current_streak: int
+    last_period: int
+    current_run: int
+    db: object = None # Database the row was read from, not a column
+
+    @staticmethod
+    def row_factory(cursor, row):
+        """sqlite3 row factory for rows with the columns of HabitDatabase.HABIT_COLUMNS.
+        The records don't know their database, pass it to to_habit() and streak_as_of().
+
+        Returns:
+            HabitRecord: the record
+        """
+        return HabitRecord(*row)
+
+    @staticmethod
+    def from_rows(rows, db=None):
+        """Build records from rows with the columns of HabitDatabase.HABIT_COLUMNS.
+        Habits share a few periodicities and many creation dates and times. sqlite3 creates a new
+        string for every value, here equal values are stored once.
+
+        Args:
+            rows (Iterable[tuple]): habit rows, e.g. from HabitDatabase.db_iter_habits()
+            db (HabitDatabase, optional): database the rows were read from. Defaults to None.
+
+        Yields:
+            HabitRecord: the records
+        """
+        shared = {}
+        share = shared.setdefault # Returns the first equal value that was seen
+        new = tuple.__new__ # Skips the argument handling of __new__() and _make()
+        for row in rows:
+            yield new(HabitRecord, (
+                row[0], row[1], row[2], share(row[3], row[3]), share(row[4], row[4]), share(row[5], row[5]),
+                row[6], row[7], row[8], row[9], db
+                ))
+
+    def to_habit(self, db=None):
+        """Create a full habit from the record
+
+        Args:
+            db (HabitDatabase, optional): database the record was read from. Defaults to the database of the record.
+
+        Raises:
+            ValueError: The record doesn't know its database and none was given
+
+        Returns:
+            Habit: the habit
+        """
+        db = db if db else self.db
+        if db is None:
+            raise ValueError(f"\nThe database of habit record {self.habit_id} is unknown")
+        return Habit._from_row(self, db)
+
+    def streak_as_of(self, as_of: date = None, db=None):
+        """Get the effective current streak for a date, see Habit.streak_as_of().
+        Uses the streak data of the record if it is known up to the date, otherwise the history is read.
+
+        Args:
+            as_of (date, optional): date the streak is evaluated for. Defaults to today.
+            db (HabitDatabase, optional): database the record was read from. Defaults to the database of the record.
+
+        Returns:
+            int: current streak on the given date
+        """
+        as_of = as_of or date.today()
+        period = period_number(as_of, self.periodicity)
+        # Weeks and months can end after as_of, the completions of the last period may be later
+        if self.last_period is None or period < self.last_period or (period == self.last_period and self.periodicity != 'daily'):
+            return self.to_habit(db).streak_as_of(as_of)
+        return streak_from_run(self.periodicity, self.last_period, self.current_run, as_of)
+
 
 class Habit:
 
@@ -20,9 +150,9 @@ class Habit:
             periodicity (str): daily, weekly. 
             creation_date (str): date the habit was created. Defaults to current date
             creation_time (str): time the habit was created. Defaults to current time
-            db (object, optional): Database connection or interface. Defaults to a new HabitDatabaase instance.
+            db (object, optional): Database connection or interface. Defaults to the shared HabitDatabase instance.
         """
-        self.db = db if db else HabitDatabase()
+        self.db = db if db else HabitDatabase.shared()
         self.habit_id = None
         self.name = name
         self.description = description
@@ -31,6 +161,8 @@ class Habit:
         self.creation_time = creation_time or str(datetime.now().time().replace(microsecond=0))
         self.longest_streak: int = 0
         self.current_streak: int = 0
+        self.last_period: int = None # Most recent completed period, see _period()
+        self.current_run: int = 0 # Consecutive completed periods up to last_period
 
     def clear_table(self):
         """Clears all entries in the habit and tracker tables and sets all ids to 0.
@@ -48,17 +180,18 @@ class Habit:
             ValueError: Habit id was not provided
             ValueError: Habit id does not exist
         """
-        db = db if db else HabitDatabase()  # Initialize database connection
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
 
         if habit_id is None:
             raise ValueError("Habit ID must be provided.")
 
-        # Validate if the habit exists before deleting
-        if not db.db_habit_exists(habit_id):
-            raise ValueError(f"No habit with ID {habit_id} exists.")
+        with db.transaction():
+            # Validate if the habit exists before deleting
+            if not db.db_habit_exists(habit_id):
+                raise ValueError(f"No habit with ID {habit_id} exists.")
 
-        # Perform the deletion
-        db.db_delete_habit(habit_id)
+            # Perform the deletion
+            db.db_delete_habit(habit_id)
         print(f"\n----Habit with ID {habit_id} successfully deleted.---")
 
     def delete_habit_instance(self):
@@ -105,7 +238,7 @@ class Habit:
         """Check for duplicates of habit names in database
             Returns bool: True if duplicate exitsts
         """
-        db = db if db else HabitDatabase()  # Initialize database connection
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
         duplicate = db.db_check_duplicate(name, periodicity)
         
         if duplicate:
@@ -119,7 +252,7 @@ class Habit:
         Returns:
             bool: true if habit exists
         """
-        db = db if db else HabitDatabase()  # Initialize database connection
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
 
         habit_exists = db.db_habit_exists(habit_id)
         return habit_exists
@@ -140,12 +273,13 @@ class Habit:
         # Check if periodicity is correct 
         self._correct_periodicity(self.periodicity)
 
-        # Check if name and periodicity pair does not exist already
-        
-        if self.db.db_check_duplicate(self.name, self.periodicity):
-            raise ValueError(f"A habit with the name '{self.name}' and periodicity '{self.periodicity}' already exists.")
-            
-        self.habit_id = self.db.db_save(self.name, self.description, self.periodicity, self.creation_date, self.creation_time)
+        with self.db.transaction():
+            # Check if name and periodicity pair does not exist already
+            if self.db.db_check_duplicate(self.name, self.periodicity):
+                raise ValueError(f"A habit with the name '{self.name}' and periodicity '{self.periodicity}' already exists.")
+                
+            self.habit_id = self.db.db_save(self.name, self.description, self.periodicity, self.creation_date, self.creation_time)
+        self.db.habit_cache.pop(self.habit_id) # Ids of deleted habits can be reused
         
     def update(self, name=None, description=None, periodicity=None):
         """
@@ -155,17 +289,27 @@ class Habit:
             name (str): Name of the  habit. Defaults to None.
             description (str): Description of habit. Defaults to None.
             periodicity (str): Periodicity of habit. Defaults to None.
+
+        Raises:
+            ValueError: Another habit with the new name and periodicity already exists.
         """
-        if name: # Set new habit name
-            self.is_duplicate(name, periodicity) # Check if habit with this name and periodicity already exists
-            self.name = name
-        if description: # Set new habit description
-            self.description = description
-        if periodicity: # Set new habit periodicity 
-            self.periodicity = periodicity
-            self._correct_periodicity(self.periodicity) # Check if periodicity was entered correctly
-        if self.habit_id: # Call update function 
-            self.db.db_update(self.habit_id, name=name, description=description, periodicity=periodicity)
+        self.db.habit_cache.pop(self.habit_id) # The attributes below change before the database is updated
+        with self.db.transaction():
+            # Check if another habit with the new name and periodicity already exists
+            new_name, new_periodicity = name or self.name, periodicity or self.periodicity
+            if (new_name, new_periodicity) != (self.name, self.periodicity) and self.is_duplicate(new_name, new_periodicity, self.db):
+                raise ValueError(f"A habit with the name '{new_name}' and periodicity '{new_periodicity}' already exists.")
+            if name: # Set new habit name
+                self.name = name
+            if description: # Set new habit description
+                self.description = description
+            if periodicity: # Set new habit periodicity 
+                self.periodicity = periodicity
+                self._correct_periodicity(self.periodicity) # Check if periodicity was entered correctly
+                self.last_period = None # Streak data has to be recalculated for the new periods
+                self.current_run = 0
+            if self.habit_id: # Call update function 
+                self.db.db_update(self.habit_id, name=name, description=description, periodicity=periodicity)
     @staticmethod
     def correct_date_format(completed_date: str):
         try:
@@ -249,15 +393,153 @@ class Habit:
         if not self.habit_id:
             raise ValueError("\nHabit must be saved before completed")
         
-        self.db.db_record_completion(self.name, self.habit_id, completed_date, completed_time)
+        # Record the completion and the new streak data together
+        self.db.habit_cache.pop(self.habit_id)
+        with self.db.transaction():
+            recorded = self.db.db_record_completion(self.name, self.habit_id, completed_date, completed_time)
 
-        #Automatically calculate and save streak data
-        if self.periodicity == 'daily':
-            self.calculate_daily_streak()
-        elif self.periodicity == 'weekly':
-            self.calculate_weekly_streak()
-        elif self.periodicity == 'monthly':
-            self.calculate_monthly_streak()
+            #Automatically update and save streak data
+            if recorded:
+                self._advance_streak(date.fromisoformat(completed_date))
+
+    @staticmethod
+    def _validate_completion(completed_date: str, completed_time: str, today: date):
+        """Validates and normalizes a single completion record of a batch.
+        Uses the same rules as zero_pad_date, validate_date and correct_time_format.
+
+        Args:
+            completed_date (str): completion date, current date if None
+            completed_time (str): completion time, current time if None
+            today (date): date used to reject completions in the future
+
+        Raises:
+            ValueError: Date or time has the wrong format or the date is in the future
+
+        Returns:
+            tuple: completion date and time
+        """
+        return Habit._validate_completion_date(completed_date, today), Habit._validate_completion_time(completed_time)
+
+    @staticmethod
+    def _validate_completion_date(completed_date: str, today: date):
+        """Validates and normalizes the date of a completion record, see _validate_completion()
+
+        Returns:
+            date: completion date
+        """
+        if completed_date is None:
+            return today
+        year, month, day = map(int, completed_date.split("-"))
+        completed_date = date(year, month, day)
+        if completed_date > today:
+            raise ValueError(f"Date {completed_date} is in the future")
+        return completed_date
+
+    @staticmethod
+    def _validate_completion_time(completed_time: str):
+        """Validates and normalizes the time of a completion record, see _validate_completion()
+
+        Returns:
+            time: completion time
+        """
+        if completed_time is None:
+            return datetime.now().time().replace(microsecond=0)
+        hour, minute, second = map(int, completed_time.split(":"))
+        return time(hour, minute, second)
+
+    @classmethod
+    def record_completions(cls, completions, db=None):
+        """Marks many habits as completed at once, e.g. to backfill completions from other trackers.
+        All records are validated before anything is written, duplicates are skipped and the
+        streaks are calculated once per habit at the end.
+
+        Args:
+            completions (Iterable[tuple]): (habit_id, completed_date, completed_time) tuples
+            db (_type_, optional): used database. Defaults to None.
+
+        Raises:
+            ValueError: A record is invalid or a habit does not exist
+
+        Returns:
+            int: number of completions that were recorded
+        """
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
+        today = date.today()
+
+        # Backfills repeat the same dates and times for many habits, every distinct value is validated once
+        dates, times = {}, {}
+        records = []
+        for index, (habit_id, completed_date, completed_time) in enumerate(completions):
+            try:
+                day = dates.get(completed_date)
+                if day is None:
+                    day = dates[completed_date] = cls._validate_completion_date(completed_date, today)
+                moment = times.get(completed_time)
+                if moment is None:
+                    moment = times[completed_time] = cls._validate_completion_time(completed_time)
+            except (ValueError, TypeError, AttributeError) as e:
+                raise ValueError(f"\nInvalid completion record {index}: {e}")
+            records.append((habit_id, day, moment))
+
+        with db.transaction():
+            recorded = db.db_record_completions(records)
+            cls._update_batch_streaks(records, db)
+
+        return recorded
+
+    @classmethod
+    def _update_batch_streaks(cls, records, db):
+        """Helper function to update the streak data of the habits of a recorded batch.
+        The streaks follow from the sorted periods of the batch if the batch holds all completions
+        of a habit or only adds periods after its current run. Only other habits, e.g. with
+        backfilled completions between older runs, read their history.
+
+        Args:
+            records (list): validated (habit_id, completed_date, completed_time) tuples
+            db (HabitDatabase): database the batch was recorded in
+        """
+        days_by_habit = {}
+        for habit_id, completed_date, _ in records:
+            days_by_habit.setdefault(habit_id, set()).add(completed_date)
+
+        recalculate = [] # Habits whose streaks depend on completions outside the batch
+        states = db.db_get_streak_states(days_by_habit)
+        for habit_id, days in days_by_habit.items():
+            periodicity, longest, last_period, run, completions = states[habit_id]
+            periods = sorted({period_number(day, periodicity) for day in days})
+            if completions == len(days): # All completions of the habit are in the batch
+                longest = 0
+            elif last_period is not None and periods[0] >= last_period: # Periods from the end of the current run on
+                periods = list(range(last_period - run + 1, last_period + 1)) + [period for period in periods if period > last_period]
+            else:
+                recalculate.append(habit_id)
+                continue
+            last_period, run, batch_longest = cls._last_and_longest_run(periods)
+            streak = streak_from_run(periodicity, last_period, run)
+            db.db_update_streak_state(habit_id, streak, max(longest, batch_longest), last_period, run)
+
+        for habit_id in recalculate:
+            cls.get_by_id(habit_id, db).calculate_streak()
+        if recalculate: # Backfilled completions may connect older runs
+            db.db_recalculate_longest_streaks(recalculate)
+
+    @staticmethod
+    def _last_and_longest_run(periods):
+        """Helper function to find the most recent and the longest run of consecutive periods
+
+        Args:
+            periods (list[int]): distinct period numbers in ascending order
+
+        Returns:
+            tuple: most recent period, length of its run and length of the longest run
+        """
+        previous = None
+        run = longest = 0
+        for period in periods:
+            run = run + 1 if previous is not None and period == previous + 1 else 1
+            longest = max(longest, run)
+            previous = period
+        return previous, run, longest
 
     def _get_completed_dates(self):
         """Retrieve all completion dates for the habit by internal id
@@ -274,35 +556,58 @@ class Habit:
 
     @classmethod
     def get_by_id(cls, habit_id, db=None):
-        """Retrieve a habit by its ID
+        """Retrieve a habit by its ID.
+        Habits are kept in the habit cache of the database (an identity map), so repeated lookups
+        return the same object without a query until the habit is changed. Like HabitSessionCache,
+        the cache is dropped when the data version of the database changed, which includes writes of
+        other connections and processes.
 
         Args:
             habit_id (int): internal database id of a habit
-            db (_type_, optional): _description_. Defaults to None.
+            db (_type_, optional): used database. Defaults to None.
 
         Raises:
             ValueError: Habit id does not exist
 
         Returns:
-            List: List with all habit values as enties
+            Habit: the habit
         """
-        db = db if db else HabitDatabase() # Initialize database connection
-        #Check if habit exists
-        if not db.db_habit_exists:
-            return
-        # Fetch habit data
-        habit_data = db.db_get_habit_by_id(habit_id)
-        # Save habit data in a List
-        habit = cls( 
-            name = habit_data[1],
-            description = habit_data[2],
-            periodicity = habit_data[3]
+        db = db if db else HabitDatabase.shared() # Use the shared database connection
+        version = db.db_data_version()
+        if version != db.habit_cache_version:
+            db.habit_cache.clear()
+            db.habit_cache_version = version
+        habit = db.habit_cache.get(habit_id)
+        if habit is None:
+            # Fetch habit data, raises a ValueError if the habit does not exist
+            habit = cls._from_row(db.db_get_habit_by_id(habit_id), db)
+            db.habit_cache.put(habit_id, habit)
+        return habit
+
+    @classmethod
+    def _from_row(cls, data, db):
+        """Create a habit from a row of the habit table
+
+        Args:
+            data (tuple): row of the habit table
+            db (HabitDatabase): database the row was read from, the habit is bound to it
+
+        Returns:
+            Habit: the habit
+        """
+        habit = cls(
+            name=data[1],
+            description=data[2],
+            periodicity=data[3],
+            creation_date=data[4],
+            creation_time=data[5],
+            db=db
             )
-        habit.habit_id = habit_data[0]
-        habit.creation_date = habit_data[4]  
-        habit.creation_time = habit_data[5]  
-        habit.longest_streak = habit_data[6]
-        habit.current_streak = habit_data[7]
+        habit.habit_id = data[0]
+        habit.longest_streak = data[6]
+        habit.current_streak = data[7]
+        habit.last_period = data[8]
+        habit.current_run = data[9]
         return habit
     
     @classmethod
@@ -315,71 +620,267 @@ class Habit:
         Returns:
             List [Habits]: List of all current habits
         """
-        db = db if db else HabitDatabase()  # Initialize database connection
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
         all_habit_data = db.db_get_all_habits()  # Retrieve all habits data
         
         # Create Habit instances for each habit record
         all_habits = []
         try:
             for data in all_habit_data:
-                habit = cls(
-                    name=data[1], 
-                    description=data[2], 
-                    periodicity=data[3],
-                )
-                habit.habit_id = data[0]
-                habit.creation_date = data[4] 
-                habit.creation_time = data[5] 
-                habit.longest_streak = data[6] 
-                habit.current_streak = data[7]
-                all_habits.append(habit)
+                all_habits.append(cls._from_row(data, db))
         except Exception as  e:
             raise RuntimeError(f"\nFailed to retrieve all habits: {e}")
         
         return all_habits
     
-    def _update_current_streak(self,streak):
-        """Updates the current streak variable in the database
+    @classmethod
+    def get_all_records(cls, db=None):
+        """Class method to retrieve all habits as read-only records for listings and analytics.
+        Much lighter than get_all_habits(), convert a record with to_habit() to change it.
+
+        Args:
+            db (_type_, optional): used database. Defaults to None.
+
+        Returns:
+            List [HabitRecord]: records of all current habits ordered by id
+        """
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
+        return list(HabitRecord.from_rows(db.db_iter_habits(), db))
+
+    @classmethod
+    def iter_habits(cls, db=None):
+        """Class method to stream all habits ordered by id, e.g. to scan large databases with flat memory use
+
+        Args:
+            db (_type_, optional): used database. Defaults to None.
+
+        Yields:
+            Habit: habits ordered by id
+        """
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
+        for data in db.db_iter_habits():
+            yield cls._from_row(data, db)
+
+    @classmethod
+    def iter_records(cls, db=None):
+        """Class method to stream all habits as read-only records ordered by id
+
+        Args:
+            db (_type_, optional): used database. Defaults to None.
+
+        Returns:
+            Iterator [HabitRecord]: records ordered by id
+        """
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
+        return HabitRecord.from_rows(db.db_iter_habits(), db)
+
+    @classmethod
+    def get_by_periodicity(cls, periodicity: str, db=None):
+        """Retrieve all habits of a periodicity, filtered by the database
+
+        Args:
+            periodicity (str): daily, weekly or monthly
+            db (_type_, optional): used database. Defaults to None.
+
+        Returns:
+            List [Habits]: habits of the periodicity
+        """
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
+        return [cls._from_row(data, db) for data in db.db_get_habits_by_periodicity(periodicity)]
+
+    @classmethod
+    def get_top_habits(cls, k: int = 1, by: str = 'longest_streak', db=None):
+        """Retrieve the k habits with the longest streaks, habits that tie with the k-th one are included
+
+        Args:
+            k (int, optional): number of habits. Defaults to 1.
+            by (str, optional): 'longest_streak' or 'current_streak'. Defaults to 'longest_streak'.
+            db (_type_, optional): used database. Defaults to None.
+
+        Returns:
+            List [Habits]: best performing habits, best first
+        """
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
+        return [cls._from_row(data, db) for data in db.db_get_top_habits(k, by)]
+
+    @classmethod
+    def get_bottom_habits(cls, k: int = 1, by: str = 'longest_streak', db=None):
+        """Retrieve the k habits with the shortest streaks, habits that tie with the k-th one are included
+
+        Args:
+            k (int, optional): number of habits. Defaults to 1.
+            by (str, optional): 'longest_streak' or 'current_streak'. Defaults to 'longest_streak'.
+            db (_type_, optional): used database. Defaults to None.
+
+        Returns:
+            List [Habits]: worst performing habits, worst first
+        """
+        db = db if db else HabitDatabase.shared()  # Use the shared database connection
+        return [cls._from_row(data, db) for data in db.db_get_top_habits(k, by, ascending=True)]
+
+    def _save_streak(self, streak: int, last_period: int = None, run: int = 0):
+        """Saves the streak data of the habit in the database
 
         Args:
             streak (int): length of current streak
+            last_period (int, optional): most recent period the habit was completed in. Defaults to None.
+            run (int, optional): length of the run of consecutive periods that ends in last_period. Defaults to 0.
         """
         self.current_streak = streak
-        self.db.db_update_streak(habit_id=self.habit_id, current_streak = streak)
-        
-    def _update_longest_streak(self, streak):
-        """Updates the longest streak variable to current streak if it is longer than previouse one
+        self.longest_streak = max(self.longest_streak, run)
+        self.last_period = last_period
+        self.current_run = run
+        self.db.db_update_streak_state(self.habit_id, self.current_streak, self.longest_streak, last_period, run)
+
+    def _period(self, day: date):
+        """Helper function to get the number of the period (day, week or month) a date lies in.
+        Consecutive periods have consecutive numbers.
 
         Args:
-            streak (int): longest ever streak
+            day (date): given date
+
+        Returns:
+            int: number of the period
         """
-        if streak > self.longest_streak:
-            self.longest_streak = streak
-            self.db.db_update_streak(habit_id=self.habit_id,longest_streak=self.longest_streak)
+        return period_number(day, self.periodicity)
+
+    def _streak_from_run(self, last_period: int, run: int, as_of: date = None):
+        """Helper function to get the current streak from the most recent run of completed periods.
+        Daily and weekly streaks are only current if the habit was completed in the current period,
+        monthly streaks also in the month after, see streak_from_run().
+
+        Args:
+            last_period (int): most recent period the habit was completed in
+            run (int): length of the run of consecutive periods that ends in last_period
+            as_of (date, optional): date the streak is evaluated for. Defaults to today.
+
+        Returns:
+            int: current streak
+        """
+        return streak_from_run(self.periodicity, last_period, run, as_of)
+
+    def streak_as_of(self, as_of: date = None):
+        """Get the effective current streak for a date without changing the stored streak data.
+        The stored current streak is only updated when the habit is completed, so it goes stale when a
+        habit is abandoned. This derives the streak from the most recent completed period instead,
+        and reads the history for dates before it. Results are cached until the database changes.
+
+        Args:
+            as_of (date, optional): date the streak is evaluated for. Defaults to today.
+
+        Returns:
+            int: current streak on the given date
+        """
+        as_of = as_of or date.today()
+        key = (self.db.db_name, self.habit_id, self.periodicity, as_of, self.db.db_data_version())
+        streak = _streak_cache.get(key)
+        if streak is not None:
+            return streak
+
+        # Use the stored streak data, the habit object itself may be outdated
+        _, _, last_period, run = self.db.db_get_streak_state(self.habit_id) or (0, 0, None, 0)
+        if last_period == self._period(as_of) and self.periodicity != 'daily':
+            # The date lies in the last completed week or month, but maybe before its completions
+            if as_of < next(self.db.db_iter_completed_dates(self.habit_id), as_of):
+                last_period = None
+        if last_period is None or self._period(as_of) < last_period:
+            # Historical date or unknown streak data, read the history up to the date
+            last_period, run = self._most_recent_run(
+                self._period(completed_date) for completed_date in self.db.db_iter_completed_dates(self.habit_id, until=as_of)
+                )
+        streak = self._streak_from_run(last_period, run, as_of)
+        _streak_cache.put(key, streak)
+        return streak
+
+    @staticmethod
+    def _most_recent_run(periods):
+        """Helper function to count the most recent run of consecutive periods.
+        Stops reading at the first gap, so only the periods of the most recent run are consumed.
+
+        Args:
+            periods (Iterable[int]): period numbers, most recent first. Repeated periods are allowed.
+
+        Returns:
+            tuple: most recent period (None if there is none) and length of its run
+        """
+        run = 0
+        last_period = None
+        for period in periods:
+            if last_period is None:
+                last_period = period
+            if period == last_period - run: # Next older period
+                run += 1
+            elif period != last_period - run + 1: # Not the same period as before either
+                break  # Streak is broken if there’s a gap
+        return last_period, run
+
+    def _iter_completed_periods(self):
+        """Stream the completed periods of the habit, most recent first
+
+        Returns:
+            Iterator[int]: period numbers, repeated if a period was completed more than once
+        """
+        return (self._period(completed_date) for completed_date in self.db.db_iter_completed_dates(self.habit_id))
+
+    def _advance_streak(self, completed_date: date):
+        """Updates the streak data for a new completion in constant time.
+        The streak is only recalculated from the full history if the completion lies before the
+        most recent completed period or the streak data of the habit is not known yet.
+
+        Args:
+            completed_date (date): date of the new completion
+        """
+        self.longest_streak, self.current_streak, self.last_period, self.current_run = self.db.db_get_streak_state(self.habit_id)
+        period = self._period(completed_date)
+
+        if self.last_period is None or period < self.last_period:
+            # Backfilled completions can also connect older runs, so the longest streak is recalculated as well
+            self.calculate_streak()
+            self.calculate_longest_streak()
+            return
+
+        if period == self.last_period + 1: # Next period, the run continues
+            run = self.current_run + 1
+        elif period > self.last_period + 1: # Gap, a new run starts
+            run = 1
+        else: # Period was already completed
+            run = self.current_run
+        self._save_streak(self._streak_from_run(period, run), period, run)
     
+    def calculate_streak(self):
+        """Calculate and save the streak data according to the periodicity of the habit.
+        """
+        if self.periodicity == 'daily':
+            self.calculate_daily_streak()
+        elif self.periodicity == 'weekly':
+            self.calculate_weekly_streak()
+        elif self.periodicity == 'monthly':
+            self.calculate_monthly_streak()
+
+    def calculate_longest_streak(self):
+        """Calculate the longest streak over the full completion history in a single sorted pass.
+        Unlike the current streak calculations this also finds old runs, e.g. after backfilling
+        completions for past dates.
+
+        Returns:
+            int: longest streak
+        """
+        self.longest_streak = self.db.db_recalculate_longest_streaks([self.habit_id])[self.habit_id]
+        return self.longest_streak
+
     def calculate_daily_streak(self):
         """Calculate the daily streak of consecutive completions.
-        """
-        completed_dates = self._get_completed_dates()
-        #Sort the List to make sure the most recent date is evaluated first
-        completed_dates = sorted(
-            {datetime.strptime(date_str, "%Y-%m-%d").date() for date_str in completed_dates}, 
-            reverse=True
-        )
 
-        streak = 0
-        today = date.today()
+        Returns:
+            int: length of streak
+        """
+        #Read the completed days most recent first, stop at the first gap.
+        #The daily streak is broken if the habit was not completed today
+        last_period, run = self._most_recent_run(self._iter_completed_periods())
+        streak = self._streak_from_run(last_period, run)
 
-        #calculate the daily streak
-        for completed_date in completed_dates:
-            if today == completed_date:
-                streak += 1
-                today -= timedelta(days=1)  # Move to the previous day
-            else:
-                break  # Streak is broken if there’s a gap
-        
-        self._update_longest_streak(streak)
-        self._update_current_streak(streak)
+        self._save_streak(streak, last_period, run)
+        return streak
      
     def _get_mondays(self,day: date):
         """Helper function to get the start of the week for a given date.
@@ -401,29 +902,17 @@ class Habit:
             int: length of streak
         """
 
-        completed_dates = self._get_completed_dates() # get completed dates from the database
-        mondays = sorted(
-            {self._get_mondays(datetime.strptime(date, "%Y-%m-%d").date()) for date in completed_dates},
-            reverse=True
-        ) # Sorted Set of all unique Mondays of the weeks where the habit was completed, this enables an algorithm to check for weekly entries
+        # Read the completed weeks (numbered by their Mondays) most recent first, stop at the first gap
+        last_period, run = self._most_recent_run(self._iter_completed_periods())
 
         # If no unique week starts, return 0 streak
-        if not mondays:
+        if last_period is None:
             return 0
 
-        streak = 0
-        current_monday = self._get_mondays(date.today())
-
-        # Calculate streak by checking consecutive weeks in the sorted list
-        for monday in mondays:
-            if current_monday == monday:
-                streak += 1
-                current_monday -= timedelta(weeks = 1)  #subtract a week and set for next comparison
-            else:
-                break  # Streak is broken if there’s a gap
+        # The weekly streak is broken if the habit was not completed this week
+        streak = self._streak_from_run(last_period, run)
 
-        self._update_longest_streak(streak)
-        self._update_current_streak(streak)
+        self._save_streak(streak, last_period, run)
         return streak
      
     def calculate_monthly_streak(self):
@@ -432,38 +921,15 @@ class Habit:
         Returns:
             int: calculated streak
         """
-        streak = 0
-        previous = None
-
-        completed_dates = self._get_completed_dates()
+        # Read the completed months (numbered as year * 12 + month - 1) most recent first, stop at the first gap.
+        # The streak counts consecutive months starting with the most recent completed month
+        last_period, run = self._most_recent_run(self._iter_completed_periods())
 
-        if not completed_dates:
+        if last_period is None:
             print("You have not completed this habit yet.")
             return
 
-        years_months = sorted({(datetime.strptime(date, "%Y-%m-%d").year, datetime.strptime(date, "%Y-%m-%d").month) for date in completed_dates}, 
-              reverse= True ) # Set of sorted and unique (year, month) pairs
-        
-        
-        for year, month in years_months:
-            # In first iteration, previous is None. Then year and month of the first entry are added
-            # Check if next month is contained, or check if there was a change in year -> add to streak else leave for loop
-            if previous is None:
-                streak += 1
-                previous= (year, month)
-            else: 
-                if (year == previous[0] and month == previous[1] - 1) or (year == previous[0] - 1 and month == 12 and previous[1] == 1):
-                    streak += 1
-                    previous = (year, month) # Update year and month
-                else:
-                    break # Streak is broken if there is a gap
-        
-        self._update_current_streak(streak)
-        self._update_longest_streak(streak)
+        streak = self._streak_from_run(last_period, run)
 
+        self._save_streak(streak, last_period, run)
         return streak
-
-
-
-
-    
\ No newline at end of file
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+
+    def __init__(self, maxsize: int = 1024):
+        """Bounded cache that drops the least recently used entries first
+
+        Args:
+            maxsize (int, optional): maximum number of entries. Defaults to 1024.
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """Get a cached value and mark it as recently used
+
+        Args:
+            key: key of the entry
+            default (optional): returned if the key is not cached. Defaults to None.
+
+        Returns:
+            cached value or default
+        """
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self._entries[key]
+
+    def put(self, key, value):
+        """Cache a value, drops the least recently used entry if the cache is full
+
+        Args:
+            key: key of the entry
+            value: value to cache
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove an entry from the cache
+
+        Args:
+            key: key of the entry
+            default (optional): returned if the key is not cached. Defaults to None.
+
+        Returns:
+            removed value or default
+        """
+        return self._entries.pop(key, default)
+
+    def clear(self):
+        """Remove all entries"""
+        self._entries.clear()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class HabitSessionCache:
+
+    def __init__(self, db, record=tuple):
+        """All habits of a database, loaded once and kept for an interactive session.
+
+        Writes of the session are announced with invalidate(habit_id), which reloads only that
+        habit. Any other change is detected from the data version of the database: changes of other
+        connections or processes (PRAGMA data_version) and unannounced changes of this connection
+        (total_changes) reload all habits on the next access.
+
+        Args:
+            db (HabitDatabase): database of the session
+            record (callable, optional): creates the cached record from a habit row. Defaults to tuple.
+        """
+        self.db = db
+        self.record = record
+        self._habits = None # Records by habit id in id order, None if not loaded
+        self._version = None # Data version of the database when the records were loaded
+
+    def _load(self):
+        """Load all habits if they are not loaded yet or the database changed"""
+        if self._habits is None or self.db.db_data_version() != self._version:
+            self._habits = {row[0]: self.record(row) for row in self.db.db_iter_habits()}
+            self._version = self.db.db_data_version()
+
+    def habits(self):
+        """Get all habits
+
+        Returns:
+            List: records of all habits ordered by id
+        """
+        self._load()
+        return list(self._habits.values())
+
+    def get(self, habit_id, default=None):
+        """Get a habit by id
+
+        Args:
+            habit_id (int): internal database id of the habit
+            default (optional): returned if the habit does not exist. Defaults to None.
+
+        Returns:
+            record of the habit or default
+        """
+        self._load()
+        return self._habits.get(habit_id, default)
+
+    def invalidate(self, habit_id=None):
+        """Announce a write of the session, call it after a habit was added, changed or deleted.
+
+        Args:
+            habit_id (int, optional): habit that was written. Defaults to None, reload all habits.
+        """
+        if self._habits is None:
+            return
+        version = self.db.db_data_version()
+        if habit_id is None or version[1] != self._version[1]:
+            self._habits = None # Reload everything, other processes changed the database as well
+            return
+
+        try:
+            self._habits[habit_id] = self.record(self.db.db_get_habit_by_id(habit_id))
+        except ValueError: # Habit was deleted
+            self._habits.pop(habit_id, None)
+        self._version = self.db.db_data_version()
+
+    def __len__(self):
+        self._load()
+        return len(self._habits)
@@ -1,5 +1,255 @@
+import atexit
+import json
+import os
 import sqlite3
-from datetime import date, datetime
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from itertools import chain, groupby
+from operator import itemgetter
+
+from completion_bitmap import CompletionBitmap
+from habit_cache import LRUCache
+
+_shared_databases = {} # Process wide databases by database path, see HabitDatabase.shared()
+
+# Completion dates are stored as day ordinals (date.toordinal()) and completion times as seconds
+# of the day. Parameters are converted where they are bound and columns where they are read, no
+# sqlite3 adapters or converters are registered since those would apply to every connection of
+# the process.
+def _time_to_seconds(value):
+    """Convert a time object to seconds of the day, None stays None"""
+    if value is None:
+        return None
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _seconds_to_time(value):
+    """Convert stored seconds of the day to a time object, NULL stays None"""
+    if value is None:
+        return None
+    minutes, second = divmod(value, 60)
+    hour, minute = divmod(minutes, 60)
+    return time(hour, minute, second)
+
+
+def _completion_row(cursor, row):
+    """Row factory for (habit_id, completed_date, completed_time) rows of the tracker table"""
+    return row[0], date.fromordinal(row[1]), _seconds_to_time(row[2])
+
+
+def _to_date(value):
+    """Convert a date string (YYYY-MM-DD, zero padding optional) to a date object
+
+    Args:
+        value (str | date): date string or date
+
+    Returns:
+        date: the date
+    """
+    if isinstance(value, str):
+        year, month, day = map(int, value.split("-"))
+        return date(year, month, day)
+    return value
+
+
+def _to_time(value):
+    """Convert a time string (hh:mm:ss, zero padding optional) to a time object
+
+    Args:
+        value (str | time): time string, time or None
+
+    Returns:
+        time: the time
+    """
+    if isinstance(value, str):
+        hour, minute, second = map(int, value.split(":"))
+        return time(hour, minute, second)
+    return value
+
+
+def _migrate_tracker_to_ordinals(database):
+    """Migration step that rebuilds the tracker table with integer dates and times.
+    The table is clustered by (habit_id, completed_date), which makes the separate unique
+    index unnecessary. Completions without a valid date can't be placed on a day and are
+    dropped, malformed times are kept as unknown.
+
+    Args:
+        database (HabitDatabase): database that is migrated
+    """
+    database.execute_query(
+        '''CREATE TABLE tracker_new (
+                    habit_id INTEGER NOT NULL,
+                    completed_date DAY_ORDINAL NOT NULL,
+                    completed_time DAY_SECONDS,
+                    PRIMARY KEY (habit_id, completed_date),
+                    FOREIGN KEY(habit_id) REFERENCES habit(id)
+                    ) WITHOUT ROWID'''
+        )
+    rows = database.execute_query(
+        '''SELECT habit_id, completed_date, completed_time FROM tracker
+                    WHERE habit_id IN (SELECT id FROM habit)'''
+        )
+    skipped = 0
+
+    def completions():
+        nonlocal skipped
+        for habit_id, completed_date, completed_time in rows:
+            try:
+                completed_date = _to_date(completed_date).toordinal()
+            except (ValueError, TypeError, AttributeError): # NULL or malformed date
+                skipped += 1
+                continue
+            try:
+                completed_time = _time_to_seconds(_to_time(completed_time))
+            except (ValueError, TypeError, AttributeError): # Malformed time
+                completed_time = None
+            yield habit_id, completed_date, completed_time
+
+    database.db.executemany(
+        '''INSERT INTO tracker_new (habit_id, completed_date, completed_time) VALUES (?, ?, ?)
+                    ON CONFLICT (habit_id, completed_date) DO NOTHING''',
+        completions()
+        )
+    if skipped:
+        print(f"Skipped {skipped} completions without a valid date while migrating {database.db_name}")
+    database.execute_query('DROP TABLE tracker')
+    database.execute_query('ALTER TABLE tracker_new RENAME TO tracker')
+
+
+# Period number (day, week or month, see Habit._period) of a completion, computed from
+# tracker.completed_date and habit.periodicity. Day ordinal + 1721424.5 is the julian day
+# number understood by strftime and ordinal 1 is a Monday.
+_PERIOD_SQL = '''CASE habit.periodicity
+                    WHEN 'daily' THEN tracker.completed_date
+                    WHEN 'weekly' THEN (tracker.completed_date - 1) / 7
+                    ELSE CAST(strftime('%Y', tracker.completed_date + 1721424.5) AS INTEGER) * 12
+                        + CAST(strftime('%m', tracker.completed_date + 1721424.5) AS INTEGER) - 1
+                END'''
+
+
+# Schema migrations in the order they are applied. PRAGMA user_version holds the number of applied
+# migrations, so new migrations must always be appended to the end of the list.
+MIGRATIONS = [
+    # 1: habit and tracker tables
+    (
+        '''CREATE TABLE IF NOT EXISTS habit (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, 
+                    name TEXT NOT NULL, 
+                    description TEXT NOT NULL,
+                    periodicity TEXT NOT NULL,
+                    creation_date TEXT NOT NULL,
+                    creation_time TEXT NOT NULL,
+                    longest_streak INTEGER DEFAULT 0,
+                    current_streak INTEGER DEFAULT 0
+                    )''',
+        '''CREATE TABLE IF NOT EXISTS tracker (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    habit_id INTEGER,
+                    completed_date TEXT,
+                    completed_time TEXT,
+                    FOREIGN KEY(habit_id) REFERENCES habit(id)
+                    )''',
+    ),
+    # 2: one completion per habit and day, which also serves as lookup index for the tracker.
+    # Databases of older versions may contain duplicate completions, keep the first one.
+    (
+        '''DELETE FROM tracker WHERE id NOT IN (
+                    SELECT MIN(id) FROM tracker GROUP BY habit_id, completed_date
+                    )''',
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_tracker_habit_date
+                    ON tracker (habit_id, completed_date)''',
+    ),
+    # 3: integer day ordinals and seconds of the day instead of date and time strings
+    (
+        _migrate_tracker_to_ordinals,
+    ),
+    # 4: state for incremental streak updates, NULL means the streak has to be calculated from the history
+    (
+        'ALTER TABLE habit ADD COLUMN last_period INTEGER',
+        'ALTER TABLE habit ADD COLUMN current_run INTEGER DEFAULT 0',
+    ),
+    # 5: completion bitmap per habit, one bit per day starting with the day ordinal in bitmap_origin
+    (
+        'ALTER TABLE habit ADD COLUMN bitmap_origin INTEGER',
+        'ALTER TABLE habit ADD COLUMN completion_bitmap BLOB',
+        lambda database: database.db_rebuild_completion_bitmaps(),
+    ),
+    # 6: indexes for best and worst performing habits
+    (
+        'CREATE INDEX IF NOT EXISTS idx_habit_longest_streak ON habit (longest_streak)',
+        'CREATE INDEX IF NOT EXISTS idx_habit_current_streak ON habit (current_streak)',
+    ),
+    # 7: index for habits of a periodicity
+    (
+        'CREATE INDEX IF NOT EXISTS idx_habit_periodicity ON habit (periodicity)',
+    ),
+    # 8: progress and habit ids of imports, see habit_import
+    (
+        '''CREATE TABLE IF NOT EXISTS import_checkpoint (
+                    source TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL
+                    )''',
+        '''CREATE TABLE IF NOT EXISTS import_habit (
+                    source TEXT NOT NULL,
+                    source_id TEXT NOT NULL,
+                    habit_id INTEGER NOT NULL,
+                    PRIMARY KEY (source, source_id)
+                    ) WITHOUT ROWID''',
+    ),
+]
+
+# Columns of the habit table that can be selected in projections
+HABIT_COLUMNS = (
+    'id', 'name', 'description', 'periodicity', 'creation_date', 'creation_time',
+    'longest_streak', 'current_streak', 'last_period', 'current_run',
+)
+# Explicit column list in the order of HABIT_COLUMNS, later migrations may add columns to the table
+_HABIT_SELECT = ', '.join(HABIT_COLUMNS)
+
+# Rows fetched at once by the streaming db_iter_* methods
+ITER_BATCH_SIZE = 1000
+
+
+def _iter_batches(cur, batch_size: int = ITER_BATCH_SIZE):
+    """Stream the rows of a cursor in batches of fetchmany, so only one batch is held in memory
+
+    Args:
+        cur (sqlite3.Cursor): executed cursor
+        batch_size (int, optional): rows per batch. Defaults to ITER_BATCH_SIZE.
+
+    Yields:
+        rows of the cursor
+    """
+    try:
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cur.close() # Release the statement if the caller stops early
+
+
+def _habit_filter(id_column: str, habit_ids=None, periodicity: str = None):
+    """Build the WHERE conditions that select the rows of some habits
+
+    Args:
+        id_column (str): column with the habit id, e.g. 'id' or 'habit_id'
+        habit_ids (Iterable[int], optional): only these habits. Defaults to all habits.
+        periodicity (str, optional): only habits of this periodicity. Defaults to all periodicities.
+
+    Returns:
+        tuple: list of conditions and list of their parameters
+    """
+    conditions, params = [], []
+    if habit_ids is not None:
+        # One parameter for any number of ids
+        conditions.append(f'{id_column} IN (SELECT value FROM json_each(?))')
+        params.append(json.dumps(list(habit_ids)))
+    if periodicity is not None:
+        conditions.append(f'{id_column} IN (SELECT id FROM habit WHERE periodicity = ?)')
+        params.append(periodicity)
+    return conditions, params
 
 
 class HabitDatabase:
@@ -8,11 +258,47 @@ class HabitDatabase:
         """Initialize the database"""
         self.db_name = db_name
         self.db = None
+        self._transaction_depth = 0 # Number of open (nested) transactions
+        self.habit_cache = LRUCache(maxsize=1024) # Hydrated habits by id, see Habit.get_by_id()
+        self.habit_cache_version = None # Data version the habit cache was filled at, see db_data_version()
         self.connect()
 
+    @classmethod
+    def shared(cls, db_name="main.db"):
+        """Get the process wide database for a database path.
+        The connection is opened and the tables are created on first use only, all later calls
+        with the same path share it.
+
+        Args:
+            db_name (str, optional): path of the database file. Defaults to "main.db".
+
+        Returns:
+            HabitDatabase: shared database for the path
+        """
+        key = db_name if db_name == ":memory:" else os.path.abspath(db_name)
+        database = _shared_databases.get(key)
+        if database is None or database.db is None:
+            database = cls(db_name)
+            _shared_databases[key] = database
+        return database
+
+    @staticmethod
+    def close_shared():
+        """Close all shared database connections, called automatically at exit.
+        """
+        for database in _shared_databases.values():
+            if database.db:
+                database.db.close()
+                database.db = None
+        _shared_databases.clear()
+
     def execute_query(self, query, params=()):
         """Execute a database query
 
+        Outside of a transaction every query is committed immediately. Inside of a transaction the
+        commit is deferred until the transaction block exits, and errors are raised so the whole
+        transaction is rolled back.
+
         Args:
             query (str): Intendet SQL Query to the database
             params (tuple, optional): parameters that are used with the query. Defaults to ().
@@ -20,54 +306,99 @@ class HabitDatabase:
         try:
             cur = self.db.cursor()
             cur.execute(query, params)
-            self.db.commit()
             return cur
         except sqlite3.Error as e:
             print(f"Error executing query: {query}. Error {e}")
-            self.db.rollback()
+            if self._transaction_depth:
+                raise
             return None
+
+    @contextmanager
+    def transaction(self):
+        """Run several queries as one unit of work, e.g. `with db.transaction(): ...`
+
+        The queries are committed together when the block exits and rolled back if an exception
+        is raised. Nested transactions are run as savepoints, so an inner block can fail and roll
+        back without affecting the outer one.
+
+        Yields:
+            HabitDatabase: the database itself
+        """
+        savepoint = f"sp_{self._transaction_depth}"
+        if self._transaction_depth:
+            self.db.execute(f"SAVEPOINT {savepoint}")
+        else:
+            self.db.execute("BEGIN")
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth:
+                self.db.execute(f"ROLLBACK TO {savepoint}")
+                self.db.execute(f"RELEASE {savepoint}")
+            else:
+                self.db.execute("ROLLBACK")
+            self.habit_cache.clear() # Cached habits may hold rolled back changes
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth:
+            self.db.execute(f"RELEASE {savepoint}")
+        else:
+            self.db.execute("COMMIT")
         
     def connect(self):
         """Connect to the database and initialize tables.
         """
+        # Autocommit mode, transactions are controlled explicitly with transaction()
+        self.db = sqlite3.connect(self.db_name, isolation_level=None)
         try:
-            self.db = sqlite3.connect(self.db_name)
             self.db.execute("PRAGMA foreign_keys = ON")  #Enforce referential integrity
             self.create_table()
-        except sqlite3.Error as e:
+        except BaseException as e:
+            # Don't keep a connection to a database with a failed migration, every later query would fail
             print(f"Error connecting to the database:{e}")
+            self.db.close()
+            self.db = None
+            raise
         
     def create_table(self):
         """Create the habit and tracker tables.
         """
-        self.execute_query(
-            '''CREATE TABLE IF NOT EXISTS habit (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                        name TEXT NOT NULL, 
-                        description TEXT NOT NULL,
-                        periodicity TEXT NOT NULL,
-                        creation_date TEXT NOT NULL,
-                        creation_time TEXT NOT NULL,
-                        longest_streak INTEGER DEFAULT 0,
-                        current_streak INTEGER DEFAULT 0
-                        )'''
-            )
-        self.execute_query(
-            '''CREATE TABLE IF NOT EXISTS tracker (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        habit_id INTEGER,
-                        completed_date TEXT,
-                        completed_time TEXT,
-                        FOREIGN KEY(habit_id) REFERENCES habit(id)
-                        )'''
-            )
+        self.migrate()
+
+    def migrate(self):
+        """Bring the database schema up to date by applying all pending migrations.
+
+        The number of applied migrations is stored in PRAGMA user_version, so connecting to an up
+        to date database only costs reading the pragma. Every migration runs in its own transaction.
+        A migration step is either an SQL statement or a function that takes the database.
+
+        Returns:
+            int: schema version of the database
+        """
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            with self.transaction():
+                for statement in statements:
+                    if callable(statement):
+                        statement(self)
+                    else:
+                        self.execute_query(statement)
+                self.db.execute(f"PRAGMA user_version = {number}")
+            version = number
+        return version
        
     def db_clear_tables(self):
         """Clears all data from habit and tracker tables, and reset id"""
-        self.execute_query('DELETE FROM tracker')
-        self.execute_query('DELETE FROM habit')
-        self.execute_query("UPDATE sqlite_sequence SET seq=0 WHERE name='habit'")
-        self.execute_query("UPDATE sqlite_sequence SET seq=0 WHERE name='tracker'")
+        with self.transaction():
+            self.execute_query('DELETE FROM tracker')
+            self.execute_query('DELETE FROM habit')
+            self.execute_query("UPDATE sqlite_sequence SET seq=0 WHERE name='habit'")
+            self.execute_query("UPDATE sqlite_sequence SET seq=0 WHERE name='tracker'")
+            self.execute_query('DELETE FROM import_checkpoint')
+            self.execute_query('DELETE FROM import_habit')
+        self.habit_cache.clear()
         
     def db_save(self, name, description, periodicity, creation_date, creation_time):
         """Insert a new habit into the habit table.
@@ -117,14 +448,20 @@ class HabitDatabase:
         Args:
             habit_id (int): internal database habit id
         """
-        self.execute_query(
-            'DELETE FROM tracker WHERE habit_id=?',
-            (habit_id,)
-            )
-        self.execute_query(
-            'DELETE FROM habit WHERE id=?', 
-            (habit_id,)
-            )
+        self.habit_cache.pop(habit_id)
+        with self.transaction():
+            self.execute_query(
+                'DELETE FROM tracker WHERE habit_id=?',
+                (habit_id,)
+                )
+            self.execute_query(
+                'DELETE FROM habit WHERE id=?', 
+                (habit_id,)
+                )
+            self.execute_query(
+                'DELETE FROM import_habit WHERE habit_id=?',
+                (habit_id,)
+                )
             
     def db_check_duplicate(self, name : str, periodicity: str):
         """Check if a habit with the given name and periodicity comby exists in the database.
@@ -148,6 +485,23 @@ class HabitDatabase:
         
         return result
 
+    def db_get_habit_id(self, name: str, periodicity: str):
+        """Get the id of the habit with the given name and periodicity
+
+        Args:
+            name (str): name of the habit
+            periodicity (str): periodicity of the habit
+
+        Returns:
+            int or None: habit id, None if there is no such habit
+        """
+        cur = self.execute_query(
+            'SELECT id FROM habit WHERE name = ? AND periodicity = ?',
+            (name, periodicity)
+            )
+        row = cur.fetchone()
+        return row[0] if row else None
+
     def db_get_habit_by_id(self, habit_id):
         """Retrieve habit details by habit_id.
 
@@ -157,36 +511,145 @@ class HabitDatabase:
         Returns:
            tuple or None: A tuple representing the habit record if found, or else None
         """
-        # Check if habit exists by id
-        if not self.db_habit_exists(habit_id):
-            raise ValueError(f"\n Habit with id {habit_id} does not exists")
-        
-        #SQL qery to get the habits information
+        #SQL qery to get the habits information, no row means the habit does not exist
         cur = self.execute_query(
-            'SELECT * FROM habit WHERE id =?',
+            f'SELECT {_HABIT_SELECT} FROM habit WHERE id =?',
             (habit_id,)
             )
+        habit = cur.fetchone()
+        if habit is None:
+            raise ValueError(f"\n Habit with id {habit_id} does not exists")
         
-        return cur.fetchone() 
+        return habit
 
-    def db_get_all_habits(self):
+    def db_get_all_habits(self, row_factory=None):
         """Retrieve all habits.
 
+        Args:
+            row_factory (callable, optional): sqlite3 row factory (cursor, row) that builds the
+                returned rows, e.g. lightweight records. Defaults to plain tuples.
+
         Returns:
-            List[Habit]: returns a list with all informaion for all habits
+            List[tuple]: returns a list with all informaion for all habits, columns as in HABIT_COLUMNS
         """
         #SQL query to get all habit data
-        cur = self.execute_query('SELECT * FROM habit')
+        cur = self.execute_query(f'SELECT {_HABIT_SELECT} FROM habit')
         
         #return if there are no habits
         if not cur: 
             print("No habits found in the database.")
             return []
         
+        cur.row_factory = row_factory # Applied when the rows are fetched, only for this cursor
         all_habits = cur.fetchall()
 
         return all_habits
 
+    def db_get_top_habits(self, k: int = 1, by: str = 'longest_streak', ascending: bool = False):
+        """Retrieve the habits with the k longest (or shortest) streaks.
+        Habits that tie with the k-th habit are included. Both queries walk the streak index, so
+        they only read the habits that are returned.
+
+        Args:
+            k (int, optional): number of habits. Defaults to 1.
+            by (str, optional): 'longest_streak' or 'current_streak'. Defaults to 'longest_streak'.
+            ascending (bool, optional): shortest streaks instead of longest. Defaults to False.
+
+        Raises:
+            ValueError: Invalid streak column
+
+        Returns:
+            List[tuple]: habit records, best (or worst) first
+        """
+        if by not in ('longest_streak', 'current_streak'):
+            raise ValueError(f"Invalid streak: {by}. Must be 'longest_streak' or 'current_streak'")
+        order, reverse, compare = ('ASC', 'DESC', '<=') if ascending else ('DESC', 'ASC', '>=')
+
+        # Streak of the k-th habit, or of the last one if there are less than k habits
+        cur = self.execute_query(
+            f'''SELECT {_HABIT_SELECT} FROM habit
+                WHERE {by} {compare} (
+                    SELECT {by} FROM (SELECT {by} FROM habit ORDER BY {by} {order} LIMIT ?)
+                    ORDER BY {by} {reverse} LIMIT 1
+                    )
+                ORDER BY {by} {order}, id''',
+            (k,)
+            )
+        return cur.fetchall()
+
+    def db_get_habits_by_periodicity(self, periodicity: str, columns=None):
+        """Retrieve the habits of a periodicity using the periodicity index.
+
+        Args:
+            periodicity (str): daily, weekly or monthly
+            columns (tuple, optional): columns to select, e.g. ('id', 'name') for listings.
+                Defaults to all columns.
+
+        Raises:
+            ValueError: Unknown column
+
+        Returns:
+            List[tuple]: habit records ordered by id
+        """
+        if columns is None:
+            selected = _HABIT_SELECT
+        else:
+            unknown = set(columns) - set(HABIT_COLUMNS)
+            if unknown:
+                raise ValueError(f"Unknown habit columns: {sorted(unknown)}")
+            selected = ', '.join(columns)
+
+        cur = self.execute_query(
+            f'SELECT {selected} FROM habit WHERE periodicity = ? ORDER BY id',
+            (periodicity,)
+            )
+        return cur.fetchall()
+
+    def db_get_habit_page(self, after_id: int = 0, limit: int = 20, name_prefix: str = None, columns=None,
+                          periodicity: str = None):
+        """Retrieve one page of habits ordered by id with keyset pagination.
+        The page starts after the last id of the previous page instead of skipping rows with OFFSET,
+        so every page is a range scan of the primary key, no matter how far into the table it is.
+
+        Args:
+            after_id (int, optional): last habit id of the previous page. Defaults to 0, the first page.
+            limit (int, optional): maximum number of habits on the page. Defaults to 20.
+            name_prefix (str, optional): only habits whose name starts with it, case insensitive.
+                Defaults to None.
+            columns (tuple, optional): columns to select, e.g. ('id', 'name') for listings.
+                Must include 'id' first to continue with the next page. Defaults to all columns.
+            periodicity (str, optional): only habits of this periodicity. Defaults to all periodicities.
+
+        Raises:
+            ValueError: Unknown column
+
+        Returns:
+            List[tuple]: habit records ordered by id
+        """
+        if columns is None:
+            selected = _HABIT_SELECT
+        else:
+            unknown = set(columns) - set(HABIT_COLUMNS)
+            if unknown:
+                raise ValueError(f"Unknown habit columns: {sorted(unknown)}")
+            selected = ', '.join(columns)
+
+        query = f'SELECT {selected} FROM habit WHERE id > ?'
+        params = [after_id]
+        if name_prefix:
+            # Escape the LIKE wildcards, the prefix is matched literally
+            escaped = name_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query += " AND name LIKE ? ESCAPE '\\'"
+            params.append(escaped + '%')
+        if periodicity is not None:
+            query += ' AND periodicity = ?'
+            params.append(periodicity)
+        query += ' ORDER BY id LIMIT ?'
+        params.append(limit)
+
+        cur = self.execute_query(query, params)
+        return cur.fetchall()
+
     def db_update(self, habit_id, name= None, description=None, periodicity=None):
         """Update a habit's description or periodicity.
 
@@ -201,21 +664,23 @@ class HabitDatabase:
             print("Invalid habit id.")
             return 
         
-        if name: # Update habit name
-            self.execute_query(
-                'UPDATE habit SET name=? WHERE id=?', 
-                (name, habit_id)
-                )
-        if description: # Update habit description
-            self.execute_query(
-                'UPDATE habit SET description=? WHERE id=?', 
-                (description, habit_id)
-                )
-        if periodicity: # Update habit periodicity
-            self.execute_query(
-                'UPDATE habit SET periodicity=? WHERE id=?', 
-                (periodicity, habit_id)
-                )
+        self.habit_cache.pop(habit_id)
+        with self.transaction():
+            if name: # Update habit name
+                self.execute_query(
+                    'UPDATE habit SET name=? WHERE id=?', 
+                    (name, habit_id)
+                    )
+            if description: # Update habit description
+                self.execute_query(
+                    'UPDATE habit SET description=? WHERE id=?', 
+                    (description, habit_id)
+                    )
+            if periodicity: # Update habit periodicity, the streak state depends on it and is reset
+                self.execute_query(
+                    'UPDATE habit SET periodicity=?, last_period=NULL, current_run=0 WHERE id=?', 
+                    (periodicity, habit_id)
+                    )
     
     def db_update_streak(self, habit_id, current_streak: int = None, longest_streak: int = None):
         """Updates the streak data in the database (current and longest)
@@ -225,25 +690,206 @@ class HabitDatabase:
             current_streak (int, optional): Current streak of a habit. Defaults to None.
             longest_streak (int, optional): longest streak of a habit. Defaults to None.
         """
-        # get current streak data
+        self.habit_cache.pop(habit_id)
+        with self.transaction():
+            # get current streak data
+            cur = self.execute_query(
+                'SELECT longest_streak, current_streak FROM habit WHERE id = ?', 
+                (habit_id,)
+                )
+            current_data = cur.fetchone()
+            #Check if streak data is not equal or empty, then update 
+            if current_data:
+                current_longest_streak, current_current_streak = current_data
+                if longest_streak is not None and longest_streak != current_longest_streak:
+                    self.execute_query(
+                        'UPDATE habit SET longest_streak=? WHERE id=?', 
+                        (longest_streak, habit_id)
+                        )
+                if current_streak is not None and current_streak != current_current_streak:
+                    self.execute_query(
+                        'UPDATE habit SET current_streak=? WHERE id=?', 
+                        (current_streak, habit_id)
+                        )
+
+    def db_get_streak_state(self, habit_id):
+        """Retrieve the streak data of a habit.
+
+        Args:
+            habit_id (int): habit id
+
+        Returns:
+            tuple or None: longest streak, current streak, last completed period and length of the
+                current run, or None if the habit doesnt exist
+        """
         cur = self.execute_query(
-            'SELECT longest_streak, current_streak FROM habit WHERE id = ?', 
+            'SELECT longest_streak, current_streak, last_period, current_run FROM habit WHERE id = ?',
             (habit_id,)
             )
-        current_data = cur.fetchone()
-        #Check if streak data is not equal or empty, then update 
-        if current_data:
-            current_longest_streak, current_current_streak = current_data
-            if longest_streak is not None and longest_streak != current_longest_streak:
-                self.execute_query(
-                    'UPDATE habit SET longest_streak=? WHERE id=?', 
-                    (longest_streak, habit_id)
+        return cur.fetchone()
+
+    def db_get_streak_states(self, habit_ids):
+        """Retrieve the streak data of many habits with a single query, e.g. after a bulk insert.
+
+        Args:
+            habit_ids (Iterable[int]): habit ids
+
+        Returns:
+            dict: periodicity, longest streak, last completed period, length of the current run and
+                number of completions by habit id, habits that dont exist are left out
+        """
+        conditions, params = _habit_filter('id', habit_ids)
+        cur = self.execute_query(
+            f'''SELECT id, periodicity, longest_streak, last_period, current_run,
+                    (SELECT COUNT(*) FROM tracker WHERE tracker.habit_id = habit.id)
+                FROM habit WHERE {conditions[0]}''',
+            params
+            )
+        return {row[0]: row[1:] for row in cur}
+
+    def db_update_streak_state(self, habit_id, current_streak: int, longest_streak: int, last_period: int, current_run: int):
+        """Updates all streak data of a habit with a single query
+
+        Args:
+            habit_id (int): habit id of completed habit
+            current_streak (int): current streak of the habit
+            longest_streak (int): longest streak of the habit
+            last_period (int): most recent period the habit was completed in
+            current_run (int): number of consecutive completed periods up to last_period
+        """
+        self.habit_cache.pop(habit_id)
+        self.execute_query(
+            '''UPDATE habit SET current_streak=?, longest_streak=?, last_period=?, current_run=?
+                WHERE id=?''',
+            (current_streak, longest_streak, last_period, current_run, habit_id)
+            )
+
+    def db_recalculate_all_streaks(self, today: date = None, habit_ids=None):
+        """Recalculate the streak data of all habits at once from their full history.
+
+        The completed periods of every habit are grouped into runs of consecutive periods (gaps and
+        islands) with window functions, and the results are written back with a single UPDATE in one
+        transaction. The longest streak is the longest run in the history.
+
+        Args:
+            today (date, optional): date the current streaks are calculated for. Defaults to today.
+            habit_ids (Iterable[int], optional): only recalculate these habits. Defaults to all habits.
+
+        Returns:
+            int: number of habits with completions that were updated
+        """
+        today = today or date.today()
+        today_periods = {
+            'daily': today.toordinal(),
+            'weekly': (today.toordinal() - 1) // 7, # Ordinal 1 is a Monday
+            'monthly': today.year * 12 + today.month - 1,
+            }
+        selected = '1'
+        if habit_ids is not None:
+            # One parameter for any number of ids
+            selected = 'habit.id IN (SELECT value FROM json_each(:habit_ids))'
+            today_periods['habit_ids'] = json.dumps(list(habit_ids))
+        with self.transaction():
+            changes_before = self.db.total_changes
+            self.execute_query(
+                f'''WITH periods AS (
+                        SELECT DISTINCT tracker.habit_id, {_PERIOD_SQL} AS period
+                        FROM tracker JOIN habit ON habit.id = tracker.habit_id
+                        WHERE {selected}
+                    ),
+                    islands AS (
+                        SELECT habit_id, period,
+                            period - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY period) AS island
+                        FROM periods
+                    ),
+                    runs AS (
+                        SELECT habit_id, MAX(period) AS last_period, COUNT(*) AS run
+                        FROM islands GROUP BY habit_id, island
+                    ),
+                    streaks AS (
+                        SELECT habit_id, last_period, run,
+                            MAX(run) OVER (PARTITION BY habit_id) AS longest_streak,
+                            ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY last_period DESC) AS recency
+                        FROM runs
                     )
-            if current_streak is not None and current_streak != current_current_streak:
-                self.execute_query(
-                    'UPDATE habit SET current_streak=? WHERE id=?', 
-                    (current_streak, habit_id)
+                    UPDATE habit SET
+                        longest_streak = streaks.longest_streak,
+                        last_period = streaks.last_period,
+                        current_run = streaks.run,
+                        current_streak = CASE
+                            WHEN habit.periodicity = 'monthly' THEN CASE
+                                WHEN streaks.last_period IN (:monthly - 1, :monthly) THEN streaks.run ELSE 0 END
+                            WHEN streaks.last_period = CASE habit.periodicity
+                                WHEN 'daily' THEN :daily ELSE :weekly END THEN streaks.run
+                            ELSE 0 END
+                    FROM streaks
+                    WHERE streaks.habit_id = habit.id AND streaks.recency = 1''',
+                today_periods
+                )
+            updated = self.db.total_changes - changes_before
+            # Habits that were never completed
+            self.execute_query(
+                f'''UPDATE habit SET longest_streak = 0, current_streak = 0, last_period = NULL, current_run = 0
+                    WHERE id NOT IN (SELECT habit_id FROM tracker) AND {selected}''',
+                today_periods
+                )
+        self.habit_cache.clear()
+        return updated
+
+    def db_recalculate_longest_streaks(self, habit_ids=None):
+        """Recalculate the longest streaks of many habits from their full history.
+
+        The completed periods of all habits are read as one stream in primary key order, which is
+        sorted by habit and date, and the longest run of each habit is found in a single pass.
+        Backfilled completions that connect older runs are taken into account.
+
+        Args:
+            habit_ids (Iterable[int], optional): habits to recalculate. Defaults to all habits.
+
+        Returns:
+            dict: longest streak by habit id
+        """
+        if habit_ids is None:
+            cur = self.db.execute(
+                f'''SELECT habit.id, {_PERIOD_SQL} FROM habit
+                    LEFT JOIN tracker ON tracker.habit_id = habit.id
+                    ORDER BY habit.id, tracker.completed_date'''
+                )
+            rows = cur
+        else:
+            # One indexed range scan per habit, chained into a single stream
+            rows = chain.from_iterable(
+                self.db.execute(
+                    f'''SELECT habit.id, {_PERIOD_SQL} FROM habit
+                        LEFT JOIN tracker ON tracker.habit_id = habit.id
+                        WHERE habit.id = ? ORDER BY tracker.completed_date''',
+                    (habit_id,)
                     )
+                for habit_id in habit_ids
+                )
+
+        longest_streaks = {}
+        for habit_id, periods in groupby(rows, key=itemgetter(0)):
+            longest = run = 0
+            previous = None
+            for _, period in periods:
+                if period is None: # Habit without completions
+                    break
+                if period == previous: # Same period as the previous completion
+                    continue
+                run = run + 1 if previous is not None and period == previous + 1 else 1
+                longest = max(longest, run)
+                previous = period
+            longest_streaks[habit_id] = longest
+
+        with self.transaction():
+            self.db.executemany(
+                'UPDATE habit SET longest_streak=? WHERE id=?',
+                ((longest, habit_id) for habit_id, longest in longest_streaks.items())
+                )
+        for habit_id in longest_streaks:
+            self.habit_cache.pop(habit_id)
+        return longest_streaks
 
     def db_already_marked_completed(self,name, habit_id, completed_date):
         """check if a habit was already marked completed on a given day.
@@ -251,14 +897,14 @@ class HabitDatabase:
         Args:
             name (str): _name of habit
             habit_id (int): habit id
-            completed_date (str): completion date
+            completed_date (str | date): completion date
 
         Returns:
             bool: True if the habit already exists and False otherwise
         """
         cur = self.execute_query(
                 'SELECT 1 FROM tracker WHERE habit_id = ? AND completed_date = ?',
-                (habit_id, completed_date)
+                (habit_id, _to_date(completed_date).toordinal())
                )
         result = cur.fetchone()
         if result and result[0] == 1:
@@ -270,34 +916,186 @@ class HabitDatabase:
     def db_record_completion(self, name, habit_id, completed_date: str = None, completed_time: str = None):
         """Mark a habit as completed for a specific date and time.
 
+        The completion is written with a single conflict-aware insert. The unique index on
+        (habit_id, completed_date) reports completions that already exist and the foreign key
+        reports unknown habits, so no separate lookups are needed.
+
         Args:
-            habit_id (int): _description_
-            completed_date (str, optional): _description_. Defaults to None.
-            completed_time (str, optional): _description_. Defaults to None.
+            name (str): name of habit
+            habit_id (int): internal database habit id
+            completed_date (str | date, optional): completion date. Defaults to None.
+            completed_time (str | time, optional): completion time. Defaults to None.
+
+        Returns:
+            bool: True if the completion was recorded, False if it was already recorded that day
+
         Raises:
-            Value Error: Habit doesnt exist
+            ValueError: Habit doesnt exist
         """
-        # check if habit exists by id
-        if not self.db_habit_exists(habit_id):
-            raise ValueError(f"\n Habit with id {habit_id} does not exists")
-
         # If date and time are not given, save current date and time
         if completed_date is None:
-            completed_date = str(date.today())
+            completed_date = date.today()
         if completed_time is None:
-            completed_time = str(datetime.now().time().replace(microsecond=0))  # Get current time without microseconds
-        
-        #check if habit was marked completed already on the day
-        result = self.db_already_marked_completed(name, habit_id, completed_date)
- 
-        if not result:
-            self.execute_query(
-            '''INSERT INTO tracker (habit_id, completed_date, completed_time)
-                VALUES (?, ?, ?)''', 
-                (habit_id, completed_date, completed_time)
+            completed_time = datetime.now().time().replace(microsecond=0)  # Get current time without microseconds
+        completed_date, completed_time = _to_date(completed_date), _to_time(completed_time)
+
+        try:
+            with self.transaction():
+                cur = self.db.execute(
+                    '''INSERT INTO tracker (habit_id, completed_date, completed_time)
+                        VALUES (?, ?, ?)
+                        ON CONFLICT (habit_id, completed_date) DO NOTHING''',
+                    (habit_id, completed_date.toordinal(), _time_to_seconds(completed_time))
+                )
+                if cur.rowcount:
+                    self._db_add_to_bitmap(habit_id, [completed_date])
+        except sqlite3.IntegrityError:
+            # Foreign key violation, the habit does not exist
+            raise ValueError(f"\n Habit with id {habit_id} does not exists")
+
+        # No row was inserted, the habit was already marked completed on the day
+        if cur.rowcount == 0:
+            print(f"\nHabit {habit_id} - '{name}' has already been marked completed today.")
+            return False
+
+        print(f"\n-----Habit {habit_id} - '{name}' was completed on {completed_date} at {completed_time}----\n")
+        return True
+
+    def db_record_completions(self, completions):
+        """Record many completions at once in a single transaction.
+
+        Completions that were already recorded for a habit on the same day are skipped.
+
+        Args:
+            completions (Iterable[tuple]): (habit_id, completed_date, completed_time) tuples with
+                validated dates and times
+
+        Returns:
+            int: number of completions that were recorded
+
+        Raises:
+            ValueError: One or more habits dont exist
+        """
+        completions = list(completions)
+        habit_ids = {completion[0] for completion in completions}
+
+        # Check all habits exist up front, so the batch is either written completely or not at all
+        existing_ids = set()
+        id_list = list(habit_ids)
+        for start in range(0, len(id_list), 500):
+            chunk = id_list[start:start + 500]
+            cur = self.db.execute(
+                f"SELECT id FROM habit WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk
+                )
+            existing_ids.update(row[0] for row in cur)
+        missing_ids = habit_ids - existing_ids
+        if missing_ids:
+            raise ValueError(f"\n Habits with ids {sorted(missing_ids)} do not exist")
+
+        changes_before = self.db.total_changes
+        with self.transaction(): # Commit once at the end, roll back everything on errors
+            self.db.executemany(
+                '''INSERT INTO tracker (habit_id, completed_date, completed_time)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (habit_id, completed_date) DO NOTHING''',
+                ((habit_id, _to_date(completed_date).toordinal(), _time_to_seconds(_to_time(completed_time)))
+                 for habit_id, completed_date, completed_time in completions)
             )
-            print(f"\n-----Habit {habit_id} - '{name}' was completed on {completed_date} at {completed_time}----\n")
-            
+            recorded = self.db.total_changes - changes_before
+
+            # Update the bitmap of every habit once
+            completed_days = {}
+            for habit_id, completed_date, _ in completions:
+                completed_days.setdefault(habit_id, []).append(_to_date(completed_date))
+            for habit_id, days in completed_days.items():
+                self._db_add_to_bitmap(habit_id, days)
+        return recorded
+
+    def db_get_completion_bitmap(self, habit_id):
+        """Retrieve the completion bitmap of a habit.
+
+        Args:
+            habit_id (int): internal database habit id
+
+        Returns:
+            CompletionBitmap or None: bitmap of the completed days, None if the habit doesnt exist
+        """
+        cur = self.execute_query(
+            'SELECT bitmap_origin, completion_bitmap, creation_date FROM habit WHERE id = ?',
+            (habit_id,)
+            )
+        row = cur.fetchone()
+        if row is None:
+            return None
+        origin, blob, creation_date = row
+        if origin is None: # Never completed, the bitmap starts with the creation date
+            origin = _to_date(creation_date).toordinal()
+        return CompletionBitmap.from_blob(origin, blob)
+
+    def db_get_completion_bitmaps(self):
+        """Retrieve the completion bitmaps of all habits, e.g. to run analytics in memory.
+
+        Returns:
+            dict: CompletionBitmap by habit id
+        """
+        cur = self.execute_query('SELECT id, bitmap_origin, completion_bitmap, creation_date FROM habit')
+        return {
+            habit_id: CompletionBitmap.from_blob(origin if origin is not None else _to_date(creation_date).toordinal(), blob)
+            for habit_id, origin, blob, creation_date in cur
+            }
+
+    def _db_add_to_bitmap(self, habit_id, days):
+        """Set the bits of completed days in the bitmap of a habit
+
+        Args:
+            habit_id (int): internal database habit id
+            days (Iterable[date]): completed days
+        """
+        bitmap = self.db_get_completion_bitmap(habit_id)
+        if bitmap is None:
+            return
+        for day in days:
+            bitmap.add(day)
+        self.execute_query(
+            'UPDATE habit SET bitmap_origin = ?, completion_bitmap = ? WHERE id = ?',
+            (bitmap.origin, bitmap.to_blob(), habit_id)
+            )
+
+    def db_rebuild_completion_bitmaps(self, habit_ids=None):
+        """Rebuild the completion bitmaps from the tracker table in one ordered stream.
+
+        Args:
+            habit_ids (Iterable[int], optional): habits to rebuild. Defaults to all habits.
+        """
+        query = '''SELECT habit.id, habit.creation_date, CAST(tracker.completed_date AS INTEGER) FROM habit
+                    LEFT JOIN tracker ON tracker.habit_id = habit.id'''
+        if habit_ids is None:
+            rows = self.db.execute(f'{query} ORDER BY habit.id, tracker.completed_date')
+        else:
+            rows = chain.from_iterable(
+                self.db.execute(f'{query} WHERE habit.id = ? ORDER BY tracker.completed_date', (habit_id,))
+                for habit_id in habit_ids
+                )
+
+        bitmaps = []
+        for habit_id, completions in groupby(rows, key=itemgetter(0)):
+            completions = list(completions)
+            creation_date = completions[0][1]
+            ordinals = [ordinal for _, _, ordinal in completions if ordinal is not None]
+            # The first completion can be earlier than the creation date
+            origin = min([_to_date(creation_date).toordinal()] + ordinals[:1])
+            bitmap = CompletionBitmap(origin)
+            for ordinal in ordinals:
+                bitmap.bits |= 1 << (ordinal - origin)
+            bitmaps.append((bitmap.origin, bitmap.to_blob(), habit_id))
+
+        with self.transaction():
+            self.db.executemany(
+                'UPDATE habit SET bitmap_origin = ?, completion_bitmap = ? WHERE id = ?',
+                bitmaps
+                )
+
     def db_get_completed_dates(self, habit_id):
         """Retrieve all completed dates for a habit.
 
@@ -305,7 +1103,7 @@ class HabitDatabase:
             habit_id (int): internal database habit id
 
         Returns:
-           List [str]: List of completed dates
+           List [date]: List of completed dates
         
         Raises: 
             Value Error: Habit doesnt exist.
@@ -325,9 +1123,196 @@ class HabitDatabase:
             print(f"No completed records found for habit_id {habit_id}.")
             return[]
         # Save all retrieved dates in a list and return it
-        completed_dates = [row[0] for row in rows]
+        completed_dates = [date.fromordinal(row[0]) for row in rows]
         return completed_dates
 
+    def db_iter_habits(self, row_factory=None, batch_size: int = ITER_BATCH_SIZE, habit_ids=None, periodicity: str = None):
+        """Stream all habits ordered by id in batches, memory use does not grow with the number of habits.
+
+        Args:
+            row_factory (callable, optional): sqlite3 row factory (cursor, row) that builds the
+                returned rows. Defaults to plain tuples.
+            batch_size (int, optional): rows fetched at once. Defaults to ITER_BATCH_SIZE.
+            habit_ids (Iterable[int], optional): only these habits. Defaults to all habits.
+            periodicity (str, optional): only habits of this periodicity. Defaults to all periodicities.
+
+        Yields:
+            tuple: habit rows, columns as in HABIT_COLUMNS
+        """
+        conditions, params = _habit_filter('id', habit_ids, periodicity)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        cur = self.db.execute(f'SELECT {_HABIT_SELECT} FROM habit {where} ORDER BY id', params)
+        cur.row_factory = row_factory
+        yield from _iter_batches(cur, batch_size)
+
+    def db_iter_completions(self, habit_id=None, batch_size: int = ITER_BATCH_SIZE, habit_ids=None,
+                            periodicity: str = None, start: date = None, end: date = None):
+        """Stream completions ordered by habit and date in batches.
+
+        Args:
+            habit_id (int, optional): only completions of this habit. Defaults to all habits.
+            batch_size (int, optional): rows fetched at once. Defaults to ITER_BATCH_SIZE.
+            habit_ids (Iterable[int], optional): only completions of these habits. Defaults to all habits.
+            periodicity (str, optional): only completions of habits of this periodicity. Defaults to all periodicities.
+            start (date, optional): only completions on or after this date. Defaults to None.
+            end (date, optional): only completions on or before this date. Defaults to None.
+
+        Yields:
+            tuple: habit id, completed date and completed time
+        """
+        conditions, params = _habit_filter('habit_id', habit_ids, periodicity)
+        if habit_id is not None:
+            conditions.append('habit_id = ?')
+            params.append(habit_id)
+        if start is not None:
+            conditions.append('completed_date >= ?')
+            params.append(start.toordinal())
+        if end is not None:
+            conditions.append('completed_date <= ?')
+            params.append(end.toordinal())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        cur = self.db.execute(
+            f'SELECT habit_id, completed_date, completed_time FROM tracker {where} ORDER BY habit_id, completed_date',
+            params
+            )
+        cur.row_factory = _completion_row
+        yield from _iter_batches(cur, batch_size)
+
+    def db_get_habit_text_lengths(self, columns, habit_ids=None, periodicity: str = None):
+        """Get the number of habits and the length of the longest value of text columns, e.g. to
+        size fixed width columns before the habits are streamed
+
+        Args:
+            columns (tuple): text columns, e.g. ('name', 'description')
+            habit_ids (Iterable[int], optional): only these habits. Defaults to all habits.
+            periodicity (str, optional): only habits of this periodicity. Defaults to all periodicities.
+
+        Raises:
+            ValueError: Unknown column
+
+        Returns:
+            tuple: number of habits and longest length by column
+        """
+        unknown = set(columns) - set(HABIT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown habit columns: {sorted(unknown)}")
+        conditions, params = _habit_filter('id', habit_ids, periodicity)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        lengths = ', '.join(f'COALESCE(MAX(LENGTH({column})), 0)' for column in columns)
+        row = self.db.execute(f'SELECT COUNT(*), {lengths} FROM habit {where}', params).fetchone()
+        return row[0], dict(zip(columns, row[1:]))
+
+    def db_data_version(self):
+        """Get a version of the database content that changes with every write.
+        Combines the changes made through this connection with PRAGMA data_version, which
+        changes when other connections commit.
+
+        Returns:
+            tuple: version of the database content
+        """
+        return self.db.total_changes, self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def db_iter_completed_dates(self, habit_id, descending: bool = True, until: date = None):
+        """Stream the completed dates of a habit in date order.
+        Rows are read from the primary key one at a time, so callers that stop early (e.g. at the
+        first gap of a streak) only read the rows they need.
+
+        Args:
+            habit_id (int): internal database habit id
+            descending (bool, optional): most recent date first. Defaults to True.
+            until (date, optional): only dates up to and including this date. Defaults to None.
+
+        Yields:
+            date: completed dates
+        """
+        order = 'DESC' if descending else 'ASC'
+        cur = self.db.execute(
+            f'''SELECT completed_date FROM tracker WHERE habit_id=? AND completed_date <= ?
+                ORDER BY completed_date {order}''',
+            (habit_id, (until or date.max).toordinal())
+            )
+        try:
+            for row in cur:
+                yield date.fromordinal(row[0])
+        finally:
+            cur.close() # Release the statement if the caller stops early
+
+    def db_get_import_checkpoint(self, source: str):
+        """Get the number of records of an import that were committed
+
+        Args:
+            source (str): name of the import
+
+        Returns:
+            int: number of committed records, 0 for a new import
+        """
+        cur = self.execute_query('SELECT position FROM import_checkpoint WHERE source = ?', (source,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+    def db_set_import_checkpoint(self, source: str, position: int):
+        """Store the number of committed records of an import, in the transaction of the records
+
+        Args:
+            source (str): name of the import
+            position (int): number of committed records
+        """
+        self.execute_query(
+            '''INSERT INTO import_checkpoint (source, position) VALUES (?, ?)
+                ON CONFLICT (source) DO UPDATE SET position = excluded.position''',
+            (source, position)
+            )
+
+    def db_reset_import_checkpoint(self, source: str):
+        """Forget the progress of an import, so it starts from the first record again
+
+        Args:
+            source (str): name of the import
+        """
+        self.execute_query('DELETE FROM import_checkpoint WHERE source = ?', (source,))
+
+    def db_get_imported_habit_id(self, source: str, source_id: str):
+        """Get the id of a habit that was imported under the id of its source
+
+        Args:
+            source (str): name of the import
+            source_id (str): id of the habit in the source
+
+        Returns:
+            int or None: habit id, None if the habit was not imported
+        """
+        cur = self.execute_query(
+            'SELECT habit_id FROM import_habit WHERE source = ? AND source_id = ?',
+            (source, source_id)
+            )
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    def db_get_imported_habit_ids(self, source: str):
+        """Get the ids of all habits of an import
+
+        Args:
+            source (str): name of the import
+
+        Returns:
+            List[int]: habit ids
+        """
+        cur = self.execute_query('SELECT habit_id FROM import_habit WHERE source = ?', (source,))
+        return [row[0] for row in cur.fetchall()]
+
+    def db_map_imported_habit(self, source: str, source_id: str, habit_id: int):
+        """Remember the habit id of an imported habit
+
+        Args:
+            source (str): name of the import
+            source_id (str): id of the habit in the source
+            habit_id (int): id of the habit in this database
+        """
+        self.execute_query(
+            'INSERT OR REPLACE INTO import_habit (source, source_id, habit_id) VALUES (?, ?, ?)',
+            (source, source_id, habit_id)
+            )
+
     def db_close(self):
         """Close the database connection
         """
@@ -338,3 +1323,6 @@ class HabitDatabase:
                 print("Database connection closed")
         except sqlite3.Error as e:
             print(f"Error closing the database: {e}")
+
+
+atexit.register(HabitDatabase.close_shared)
@@ -0,0 +1,259 @@
+#Streaming export of habits and their completion history to CSV, JSON lines or NumPy .npy files.
+#Rows are read in fetchmany batches and written right away, so memory use does not depend on the size
+#of the database. The .npy files are written without NumPy, one file per column, and can be loaded with
+#numpy.load().
+import csv
+import json
+import os
+import struct
+import sys
+from array import array
+from datetime import date
+
+from habit import streak_from_run
+from habit_database import HabitDatabase, HABIT_COLUMNS, ITER_BATCH_SIZE
+
+EXPORT_FORMATS = ('csv', 'jsonl', 'npy')
+COMPLETION_COLUMNS = ('habit_id', 'completed_date', 'completed_time')
+
+# Text columns of the habit table, exported as fixed width unicode columns
+_TEXT_COLUMNS = ('name', 'description', 'periodicity')
+
+# date(1970, 1, 1).toordinal(), .npy dates are days since the epoch
+_EPOCH_ORDINAL = 719163
+# Value of NaT (not a time) in datetime64 and timedelta64 columns
+_NAT = -2**63
+# Bytes reserved for the .npy header, so the row count can be filled in after the rows were written
+_NPY_HEADER_SIZE = 128
+
+
+def _npy_header(descr: str, count: int):
+    """Build a .npy (format version 1.0) header of _NPY_HEADER_SIZE bytes
+
+    Args:
+        descr (str): NumPy type of the column, e.g. '<i8'
+        count (int): number of rows
+
+    Returns:
+        bytes: the header
+    """
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({count},), }}"
+    header = header.ljust(_NPY_HEADER_SIZE - 11) + '\n' # Magic, version and length take 10 bytes
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+class _NpyColumn:
+
+    def __init__(self, path: str, descr: str, width: int = 0):
+        """Column of a .npy file that is written in batches
+
+        Args:
+            path (str): path of the .npy file
+            descr (str): '<i8' for integers, '<M8[D]' for dates, '<m8[s]' for times or '<U' for text
+            width (int, optional): characters per value of text columns. Defaults to 0.
+        """
+        self.file = open(path, 'wb')
+        self.descr = f'<U{max(width, 1)}' if descr == '<U' else descr
+        self.width = max(width, 1)
+        self.count = 0
+        self.file.write(_npy_header(self.descr, 0))
+
+    def write(self, values):
+        """Append values, integers (days and seconds for dates and times) or strings
+
+        Args:
+            values (list): values of a batch
+        """
+        if self.descr.startswith('<U'):
+            size = self.width * 4
+            self.file.write(b''.join(value.encode('utf-32-le').ljust(size, b'\0') for value in values))
+        else:
+            data = array('q', values)
+            if sys.byteorder == 'big':
+                data.byteswap()
+            self.file.write(data.tobytes())
+        self.count += len(values)
+
+    def close(self):
+        """Fill in the number of rows and close the file"""
+        self.file.seek(0)
+        self.file.write(_npy_header(self.descr, self.count))
+        self.file.close()
+
+
+def _days(value):
+    """Days since 1970-01-01 of a date or an ISO date string, NaT for None"""
+    if value is None:
+        return _NAT
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+def _seconds(value):
+    """Seconds since midnight of a time or an hh:mm:ss string, NaT for None"""
+    if value is None:
+        return _NAT
+    if isinstance(value, str):
+        hour, minute, second = map(int, value.split(':'))
+        return hour * 3600 + minute * 60 + second
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _write_rows(rows, columns, path: str, fmt: str, npy_columns=None):
+    """Write a stream of rows in batches
+
+    Args:
+        rows (Iterable[tuple]): rows with the values of the columns
+        columns (tuple): column names
+        path (str): file, or directory of the .npy files
+        fmt (str): 'csv', 'jsonl' or 'npy'
+        npy_columns (dict, optional): (descr, converter, width) by column for 'npy'. Defaults to None.
+
+    Raises:
+        ValueError: Unknown format
+
+    Returns:
+        int: number of rows
+    """
+    count = 0
+    if fmt == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(['' if value is None else str(value) for value in row])
+                count += 1
+    elif fmt == 'jsonl':
+        with open(path, 'w', encoding='utf-8') as file:
+            for row in rows:
+                record = {column: value if value is None or isinstance(value, (int, str)) else str(value)
+                          for column, value in zip(columns, row)}
+                file.write(json.dumps(record) + '\n')
+                count += 1
+    elif fmt == 'npy':
+        os.makedirs(path, exist_ok=True)
+        files = [_NpyColumn(os.path.join(path, f'{column}.npy'), npy_columns[column][0], npy_columns[column][2])
+                 for column in columns]
+        converters = [npy_columns[column][1] for column in columns]
+        try:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == ITER_BATCH_SIZE:
+                    count += _write_npy_batch(files, converters, batch)
+                    batch = []
+            count += _write_npy_batch(files, converters, batch)
+        finally:
+            for file in files:
+                file.close()
+    else:
+        raise ValueError(f"Unknown export format: {fmt}. Must be {EXPORT_FORMATS}")
+    return count
+
+
+def _write_npy_batch(files, converters, batch):
+    """Write a batch of rows column by column
+
+    Returns:
+        int: number of rows
+    """
+    for index, (file, convert) in enumerate(zip(files, converters)):
+        file.write([convert(row[index]) for row in batch])
+    return len(batch)
+
+
+def export_habits(db: HabitDatabase, path: str, fmt: str = 'csv', habit_ids=None, periodicity: str = None,
+                  as_of: date = None):
+    """Export habits with their streak data. The current streak is the effective streak on as_of,
+    the stored one goes stale when a habit is abandoned.
+
+    Args:
+        db (HabitDatabase): database to export
+        path (str): output file, or output directory for 'npy'
+        fmt (str, optional): 'csv', 'jsonl' or 'npy'. Defaults to 'csv'.
+        habit_ids (Iterable[int], optional): only these habits. Defaults to all habits.
+        periodicity (str, optional): only habits of this periodicity. Defaults to all periodicities.
+        as_of (date, optional): date of the current streaks. Defaults to today.
+
+    Returns:
+        int: number of exported habits
+    """
+    as_of = as_of or date.today()
+    npy_columns = None
+    if fmt == 'npy':
+        # Text columns have a fixed width, measured before the habits are streamed
+        _, widths = db.db_get_habit_text_lengths(_TEXT_COLUMNS, habit_ids, periodicity)
+        integer = ('<i8', lambda value: value, 0)
+        npy_columns = {column: integer for column in HABIT_COLUMNS}
+        npy_columns.update({column: ('<U', lambda value: value, widths[column]) for column in _TEXT_COLUMNS})
+        npy_columns['creation_date'] = ('<M8[D]', _days, 0)
+        npy_columns['creation_time'] = ('<m8[s]', _seconds, 0)
+        npy_columns['last_period'] = ('<i8', lambda value: -1 if value is None else value, 0) # -1 if never completed
+
+    def habits():
+        for row in db.db_iter_habits(habit_ids=habit_ids, periodicity=periodicity):
+            last_period, current_run = row[8], row[9]
+            if last_period is not None:
+                row = row[:7] + (streak_from_run(row[3], last_period, current_run, as_of),) + row[8:]
+            yield row
+
+    return _write_rows(habits(), HABIT_COLUMNS, path, fmt, npy_columns)
+
+
+def export_completions(db: HabitDatabase, path: str, fmt: str = 'csv', habit_ids=None, periodicity: str = None,
+                       start: date = None, end: date = None):
+    """Export the completion history ordered by habit and date
+
+    Args:
+        db (HabitDatabase): database to export
+        path (str): output file, or output directory for 'npy'
+        fmt (str, optional): 'csv', 'jsonl' or 'npy'. Defaults to 'csv'.
+        habit_ids (Iterable[int], optional): only completions of these habits. Defaults to all habits.
+        periodicity (str, optional): only completions of habits of this periodicity. Defaults to all periodicities.
+        start (date, optional): only completions on or after this date. Defaults to None.
+        end (date, optional): only completions on or before this date. Defaults to None.
+
+    Returns:
+        int: number of exported completions
+    """
+    npy_columns = {
+        'habit_id': ('<i8', lambda value: value, 0),
+        'completed_date': ('<M8[D]', _days, 0),
+        'completed_time': ('<m8[s]', _seconds, 0),
+    }
+    completions = db.db_iter_completions(habit_ids=habit_ids, periodicity=periodicity, start=start, end=end)
+    return _write_rows(completions, COMPLETION_COLUMNS, path, fmt, npy_columns)
+
+
+def export_all(db: HabitDatabase, directory: str, fmt: str = 'csv', habit_ids=None, periodicity: str = None,
+               start: date = None, end: date = None):
+    """Export habits and completions into a directory, as habits.<fmt> and completions.<fmt> files or
+    as habits and completions directories of .npy files. Both are read in one transaction, so they
+    are consistent with each other.
+
+    Args:
+        db (HabitDatabase): database to export
+        directory (str): output directory, created if it does not exist
+        fmt (str, optional): 'csv', 'jsonl' or 'npy'. Defaults to 'csv'.
+        habit_ids (Iterable[int], optional): only these habits. Defaults to all habits.
+        periodicity (str, optional): only habits of this periodicity. Defaults to all periodicities.
+        start (date, optional): only completions on or after this date. Defaults to None.
+        end (date, optional): only completions on or before this date. Defaults to None.
+
+    Raises:
+        ValueError: Unknown format
+
+    Returns:
+        dict: number of exported habits and completions
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}. Must be {EXPORT_FORMATS}")
+    os.makedirs(directory, exist_ok=True)
+    suffix = '' if fmt == 'npy' else f'.{fmt}'
+    with db.transaction():
+        habits = export_habits(db, os.path.join(directory, f'habits{suffix}'), fmt, habit_ids, periodicity)
+        completions = export_completions(
+            db, os.path.join(directory, f'completions{suffix}'), fmt, habit_ids, periodicity, start, end
+            )
+    return {'habits': habits, 'completions': completions}
@@ -0,0 +1,192 @@
+#Streaming import of habits and completions from other habit trackers, e.g. when users migrate.
+#Records are read one at a time from CSV or JSON lines files and written in batches. Every batch is
+#committed together with a checkpoint, so an interrupted import resumes after the last committed batch.
+import csv
+import json
+import os
+from datetime import date
+from itertools import islice
+
+from habit import Habit
+from habit_database import HabitDatabase
+
+# Records written per transaction
+IMPORT_BATCH_SIZE = 10000
+
+# File formats by file extension
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl'}
+
+
+def read_records(file, fmt: str):
+    """Stream the records of a CSV file with a header row or of a JSON lines file
+
+    Args:
+        file (file): open text file
+        fmt (str): 'csv' or 'jsonl'
+
+    Raises:
+        ValueError: Unknown format or a line is not a JSON object
+
+    Yields:
+        dict: records, empty CSV fields are None
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(file):
+            yield {key: value if value != '' else None for key, value in row.items()}
+    elif fmt == 'jsonl':
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError(f"Not a JSON object: {line.strip()}")
+            yield record
+    else:
+        raise ValueError(f"Unknown import format: {fmt}. Must be {sorted(set(FORMATS.values()))}")
+
+
+def _batches(records, batch_size: int):
+    """Split a stream of records into lists of batch_size records
+
+    Yields:
+        list: records of a batch
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _import_habit(db: HabitDatabase, source: str, record: dict, today: date):
+    """Validate and save a habit record. A habit with the same name and periodicity is reused, so
+    importing the same habits twice does not create duplicates.
+
+    Args:
+        db (HabitDatabase): database of the import
+        source (str): name of the import
+        record (dict): name, periodicity and optional id, description, creation_date and creation_time
+        today (date): date used to reject creation dates in the future
+
+    Returns:
+        tuple: habit id and True if the habit was created
+    """
+    creation_date, creation_time = Habit._validate_completion(record.get('creation_date'), record.get('creation_time'), today)
+    habit = Habit(
+        name=record.get('name'),
+        description=record.get('description') or '',
+        periodicity=record.get('periodicity'),
+        creation_date=str(creation_date),
+        creation_time=str(creation_time),
+        db=db
+        )
+    habit_id = db.db_get_habit_id(habit.name, habit.periodicity)
+    created = habit_id is None
+    if created:
+        habit.save() # Validates name and periodicity
+        habit_id = habit.habit_id
+    if record.get('id') is not None:
+        db.db_map_imported_habit(source, str(record['id']), habit_id)
+    return habit_id, created
+
+
+def import_records(db: HabitDatabase, records, source: str, batch_size: int = IMPORT_BATCH_SIZE, today: date = None):
+    """Import a stream of habit and completion records in batched transactions.
+
+    Records with a completed_date are completions, all others are habits. A completion refers to its
+    habit by habit_id, which is the id of a habit record of the same import or of an earlier run of it.
+    Completions of habits that were not imported fail, use Habit.record_completions() for those.
+    Dates are validated with the rules of Habit.record_completions(), also accepting dates without
+    zero padding. Completions that already exist are skipped.
+
+    The checkpoint of the import is the number of committed records. Records up to the checkpoint are
+    skipped, so running an interrupted import again continues after the last committed batch.
+    Streaks of the habits the import touched are recalculated once at the end.
+
+    Args:
+        db (HabitDatabase): database to import into
+        records (Iterable[dict]): habit and completion records, e.g. from read_records()
+        source (str): name of the import, identifies its checkpoint and habit ids
+        batch_size (int, optional): records per transaction. Defaults to IMPORT_BATCH_SIZE.
+        today (date, optional): date used to reject dates in the future. Defaults to today.
+
+    Raises:
+        ValueError: A record is invalid, the batch of the record is rolled back
+
+    Returns:
+        dict: import statistics, 'existing_habits' counts habit records of habits that already
+            existed and 'duplicate_completions' completions that were already recorded
+    """
+    today = today or date.today()
+    position = db.db_get_import_checkpoint(source)
+    stats = {'source': source, 'resumed_at': position, 'habits': 0, 'completions': 0,
+             'existing_habits': 0, 'duplicate_completions': 0}
+    habit_ids = {} # Habit id by source id, grows with the number of habits only
+    # Habits whose streaks change, batches committed by an interrupted earlier run included
+    touched = set(db.db_get_imported_habit_ids(source)) if position else set()
+
+    for batch in _batches(islice(records, position, None), batch_size):
+        with db.transaction():
+            completions = []
+            for number, record in enumerate(batch, start=position + 1):
+                try:
+                    if record.get('completed_date'):
+                        source_id = str(record['habit_id'])
+                        habit_id = habit_ids.get(source_id)
+                        if habit_id is None:
+                            # Only ids of imported habits, a local id could silently point to another habit
+                            habit_id = db.db_get_imported_habit_id(source, source_id)
+                            if habit_id is None:
+                                raise ValueError(f"Unknown habit id {source_id}, no habit with this id was imported")
+                            habit_ids[source_id] = habit_id
+                        completed_date, completed_time = Habit._validate_completion(
+                            record['completed_date'], record.get('completed_time'), today
+                            )
+                        completions.append((habit_id, completed_date, completed_time))
+                        touched.add(habit_id)
+                    else:
+                        habit_id, created = _import_habit(db, source, record, today)
+                        if record.get('id') is not None:
+                            habit_ids[str(record['id'])] = habit_id
+                        stats['habits' if created else 'existing_habits'] += 1
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    raise ValueError(f"\nInvalid record {number} of import '{source}': {e}")
+
+            recorded = db.db_record_completions(completions)
+            position += len(batch)
+            db.db_set_import_checkpoint(source, position)
+        stats['completions'] += recorded
+        stats['duplicate_completions'] += len(completions) - recorded
+
+    if touched:
+        db.db_recalculate_all_streaks(today, touched)
+    stats['position'] = position
+    return stats
+
+
+def import_file(db: HabitDatabase, path: str, source: str = None, fmt: str = None,
+                batch_size: int = IMPORT_BATCH_SIZE, restart: bool = False):
+    """Import a CSV or JSON lines file, see import_records()
+
+    Args:
+        db (HabitDatabase): database to import into
+        path (str): path of the file
+        source (str, optional): name of the import. Defaults to the absolute path, size and
+            modification time of the file, so a changed or another file with the same name does not
+            resume the checkpoint of an earlier import.
+        fmt (str, optional): 'csv' or 'jsonl'. Defaults to the format of the file extension.
+        batch_size (int, optional): records per transaction. Defaults to IMPORT_BATCH_SIZE.
+        restart (bool, optional): ignore the checkpoint and import all records again. Defaults to False.
+
+    Returns:
+        dict: import statistics
+    """
+    if source is None:
+        stat = os.stat(path)
+        source = f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'
+    fmt = fmt or FORMATS.get(os.path.splitext(path)[1].lower())
+    if restart:
+        db.db_reset_import_checkpoint(source)
+    with open(path, newline='', encoding='utf-8') as file:
+        return import_records(db, read_records(file, fmt), source, batch_size)
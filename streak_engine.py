@@ -0,0 +1,143 @@
+#Vectorized streak calculation for many habits at once, e.g. for offline analytics.
+#Gives the same results as the calculate_*_streak methods of Habit. Needs NumPy, which is optional.
+from datetime import date
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, only this module needs it
+    np = None
+
+# Periodicity codes used in the arrays
+DAILY, WEEKLY, MONTHLY = 0, 1, 2
+PERIODICITY_CODES = {'daily': DAILY, 'weekly': WEEKLY, 'monthly': MONTHLY}
+
+# date(1970, 1, 1).toordinal(), converts day ordinals to numpy datetime64 days
+_EPOCH_ORDINAL = 719163
+
+
+def _require_numpy():
+    """Raise an error if NumPy is not installed
+
+    Raises:
+        ImportError: NumPy is not installed
+    """
+    if np is None:
+        raise ImportError("The streak engine needs NumPy. Install it with 'pip install numpy'.")
+
+
+def periods(day_ordinals, periodicity_codes):
+    """Get the period numbers of days, consecutive periods have consecutive numbers.
+    Days are numbered by their ordinal, weeks by the ordinal of their Monday divided by 7 (like
+    Habit._get_mondays) and months as year * 12 + month - 1, the same numbering as Habit._period.
+
+    Args:
+        day_ordinals (array): day ordinals (date.toordinal())
+        periodicity_codes (array): DAILY, WEEKLY or MONTHLY per day
+
+    Returns:
+        array: period number per day
+    """
+    _require_numpy()
+    day_ordinals = np.asarray(day_ordinals, dtype=np.int64)
+    periodicity_codes = np.asarray(periodicity_codes)
+
+    weeks = (day_ordinals - 1) // 7 # Ordinal 1 is a Monday
+    months = (day_ordinals - _EPOCH_ORDINAL).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) + 1970 * 12
+    return np.where(periodicity_codes == DAILY, day_ordinals, np.where(periodicity_codes == WEEKLY, weeks, months))
+
+
+def calculate_streaks(habit_ids, day_ordinals, periodicities, as_of: date = None):
+    """Calculate the streak data of all habits at once.
+
+    Completions are bucketed into periods, sorted by habit and period and split into runs of
+    consecutive periods where the difference between neighbours is not 1. The run lengths follow
+    from a cumulative sum, so no Python loop over completions or habits is needed.
+
+    Args:
+        habit_ids (array): habit id per completion
+        day_ordinals (array): day ordinal (date.toordinal()) per completion
+        periodicities (dict): periodicity ('daily', 'weekly' or 'monthly') by habit id
+        as_of (date, optional): date the streaks are calculated for, later completions are
+            ignored. Defaults to today.
+
+    Returns:
+        dict: arrays 'habit_id', 'current_streak', 'longest_streak', 'last_period' and 'current_run'
+            with one entry per habit that was completed up to as_of, sorted by habit id
+    """
+    _require_numpy()
+    as_of = as_of or date.today()
+    habit_ids = np.asarray(habit_ids, dtype=np.int64)
+    day_ordinals = np.asarray(day_ordinals, dtype=np.int64)
+
+    # Ignore completions after the reference date
+    valid = day_ordinals <= as_of.toordinal()
+    habit_ids, day_ordinals = habit_ids[valid], day_ordinals[valid]
+
+    # Periodicity code per completion, looked up once per habit
+    unique_ids, inverse = np.unique(habit_ids, return_inverse=True)
+    habit_codes = np.array([PERIODICITY_CODES[periodicities[habit_id]] for habit_id in unique_ids.tolist()], dtype=np.int64)
+    row_periods = periods(day_ordinals, habit_codes[inverse])
+
+    # Unique (habit, period) pairs sorted by habit and period
+    order = np.lexsort((row_periods, habit_ids))
+    habit_ids, row_periods = habit_ids[order], row_periods[order]
+    keep = np.ones(len(habit_ids), dtype=bool)
+    keep[1:] = (np.diff(habit_ids) != 0) | (np.diff(row_periods) != 0)
+    habit_ids, row_periods = habit_ids[keep], row_periods[keep]
+
+    if not len(habit_ids):
+        empty = np.zeros(0, dtype=np.int64)
+        return {'habit_id': empty, 'current_streak': empty, 'longest_streak': empty, 'last_period': empty, 'current_run': empty}
+
+    # A new run starts at every new habit and every gap between periods
+    run_start = np.ones(len(habit_ids), dtype=bool)
+    run_start[1:] = (np.diff(habit_ids) != 0) | (np.diff(row_periods) != 1)
+    run_ids = np.cumsum(run_start) - 1
+    run_lengths = np.bincount(run_ids)
+    run_habits = habit_ids[run_start]
+    run_ends = np.flatnonzero(np.append(run_start[1:], True)) # last completion of every run
+    run_last_periods = row_periods[run_ends]
+
+    # Runs are sorted by habit, so each habit's runs form one block with its most recent run last
+    habit_start = np.ones(len(run_habits), dtype=bool)
+    habit_start[1:] = np.diff(run_habits) != 0
+    block_starts = np.flatnonzero(habit_start)
+    block_ends = np.append(block_starts[1:], len(run_habits)) - 1
+
+    result_ids = run_habits[block_starts]
+    longest_streak = np.maximum.reduceat(run_lengths, block_starts)
+    last_period = run_last_periods[block_ends]
+    current_run = run_lengths[block_ends]
+
+    # Streaks are current if the habit was completed in the period of as_of, monthly streaks also
+    # if it was completed in the month before
+    result_codes = habit_codes[np.searchsorted(unique_ids, result_ids)]
+    as_of_periods = periods(np.full(len(result_ids), as_of.toordinal()), result_codes)
+    is_current = (last_period == as_of_periods) | ((result_codes == MONTHLY) & (last_period == as_of_periods - 1))
+    current_streak = np.where(is_current, current_run, 0)
+
+    return {
+        'habit_id': result_ids,
+        'current_streak': current_streak,
+        'longest_streak': longest_streak,
+        'last_period': last_period,
+        'current_run': current_run,
+    }
+
+
+def load_completions(db):
+    """Load all completions and periodicities of a database into columnar arrays.
+
+    Args:
+        db (HabitDatabase): database to load from
+
+    Returns:
+        tuple: habit id array, day ordinal array and periodicity by habit id
+    """
+    _require_numpy()
+    # The CAST skips the date converter of the column, the engine works on the raw ordinals
+    cur = db.db.execute('SELECT habit_id, CAST(completed_date AS INTEGER) FROM tracker')
+    completions = np.fromiter(chain.from_iterable(cur), dtype=np.int64).reshape(-1, 2)
+    periodicities = dict(db.db.execute('SELECT id, periodicity FROM habit').fetchall())
+    return completions[:, 0], completions[:, 1], periodicities
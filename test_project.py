@@ -1,9 +1,16 @@
 from calendar import month
 import analysis
+import habit_export
+import habit_import
+from habit_cache import HabitSessionCache
 from habit_database import HabitDatabase
-from habit import Habit
-from datetime import date, timedelta
+from habit import Habit, HabitRecord
+from datetime import date, time, timedelta
 import pytest
+import sqlite3
+import random
+import os
+import json
 
 
 class TestHabit:
@@ -202,4 +209,667 @@ class TestHabit:
     analysis.a1_print_habits_by_periodicity(all_habit_data, 'monthly')
     analysis.a1_print_longest_streak(all_habit_data)
     analysis.a1_print_all_habits(all_habit_data)
-    
+
+
+  def test_update_duplicate(self):
+    read = Habit(name="Read", description="Read 10 pages", periodicity="daily", db=self.db)
+    read.save()
+    write = Habit(name="Write", description="Write a page", periodicity="weekly", db=self.db)
+    write.save()
+
+    with pytest.raises(ValueError):
+      write.update(name="Read", periodicity="daily") # Read daily exists
+    write.update(name="Read") # Read weekly doesn't exist
+    with pytest.raises(ValueError):
+      write.update(periodicity="daily") # Only the periodicity changes
+    assert (Habit.get_by_id(write.habit_id, self.db).name, write.periodicity) == ("Read", "weekly")
+
+    read.update(name="Read", description="Read 20 pages") # Unchanged name of the habit itself
+    assert Habit.get_by_id(read.habit_id, self.db).description == "Read 20 pages"
+
+  def test_record_completion_conflict(self):
+    habit = Habit(name="Read", description="Read 10 pages", periodicity="daily", db=self.db)
+    habit.save()
+    assert self.db.db_record_completion(habit.name, habit.habit_id, "2024-11-01", "08:00:00") is True
+    assert self.db.db_record_completion(habit.name, habit.habit_id, "2024-11-01", "09:00:00") is False
+    assert self.db.db_get_completed_dates(habit.habit_id) == [date(2024, 11, 1)]
+
+    with pytest.raises(ValueError):
+      self.db.db_record_completion("Unknown", 9999, "2024-11-01", "08:00:00") # Habit doesnt exist
+
+  def test_record_completions_bulk(self):
+    habit = Habit(name="Walk", description="Walk 10000 steps", periodicity="daily", db=self.db)
+    habit.save()
+    completions = [(habit.habit_id, str(date.today()-timedelta(days=day)), "07:00:00") for day in range(10)]
+    completions.append((habit.habit_id, str(date.today()), None)) # duplicate is skipped
+
+    assert Habit.record_completions(completions, self.db) == 10
+    assert Habit.get_by_id(habit.habit_id, self.db).current_streak == 10
+
+    with pytest.raises(ValueError):
+      Habit.record_completions([(habit.habit_id, "2024-13-01", None)], self.db) # Invalid date
+    with pytest.raises(ValueError):
+      Habit.record_completions([(9999, "2024-11-01", None)], self.db) # Habit doesnt exist
+
+  def test_record_completions_streaks_from_batch(self):
+    rng = random.Random(11)
+    today = date.today()
+    for periodicity, step in (("daily", 1), ("weekly", 7), ("monthly", 28)):
+      habit = Habit(name="Batches", description="Streaks of batches", periodicity=periodicity, db=self.db)
+      habit.save()
+      # A new habit with gaps, periods after its current run, backfills between older runs and
+      # another day of the most recent period
+      older = [offset * step for offset in rng.sample(range(10, 60), 50)]
+      batches = (older[:30], [offset * step for offset in rng.sample(range(10), 10)], older[30:], [1])
+      for batch in batches:
+        Habit.record_completions([(habit.habit_id, str(today - timedelta(days=offset)), None) for offset in batch], self.db)
+        habit = Habit.get_by_id(habit.habit_id, self.db)
+        batched = (habit.current_streak, habit.longest_streak, habit.last_period, habit.current_run)
+        habit.calculate_streak()
+        habit.calculate_longest_streak()
+        assert batched == (habit.current_streak, habit.longest_streak, habit.last_period, habit.current_run)
+      assert habit.current_streak == habit.longest_streak > 0 # No gaps are left
+
+  def test_transaction(self):
+    habit = Habit(name="Stretch", description="Stretch for 5 minutes", periodicity="daily", db=self.db)
+    with self.db.transaction():
+      habit.save()
+      with pytest.raises(ValueError):
+        with self.db.transaction(): # Nested transaction is rolled back on its own
+          habit.record_completion(str(date.today()), "08:00:00")
+          raise ValueError("Abort inner transaction")
+    assert Habit.habit_exists(habit.habit_id, self.db)
+    assert self.db.db_get_completed_dates(habit.habit_id) == []
+
+    with pytest.raises(ValueError):
+      with self.db.transaction():
+        self.db.db_delete_habit(habit.habit_id)
+        raise ValueError("Abort transaction")
+    assert Habit.habit_exists(habit.habit_id, self.db)
+
+  def test_shared_connection(self, monkeypatch):
+    db = HabitDatabase.shared("test.db")
+    assert HabitDatabase.shared("./test.db") is db
+    for i in range(5):
+      Habit(name=f"Habit {i}", description="Shared connection", periodicity="daily", db=db).save()
+
+    # Loading habits must not open any further connections
+    connections = []
+    original_connect = sqlite3.connect
+    monkeypatch.setattr(sqlite3, "connect", lambda *args, **kwargs: connections.append(args) or original_connect(*args, **kwargs))
+    habits = Habit.get_all_habits(db)
+    assert len(habits) == 5
+    assert all(habit.db is db for habit in habits)
+    assert connections == []
+
+  def test_migrations(self):
+    from habit_database import MIGRATIONS
+    assert self.db.migrate() == len(MIGRATIONS)
+    assert self.db.db.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert self.db.migrate() == len(MIGRATIONS) # Up to date database is left alone
+
+  def test_migrate_legacy_tracker(self, tmp_path):
+    from habit_database import MIGRATIONS
+    # Version 2 database with completions that have no valid date or time
+    legacy = sqlite3.connect(tmp_path / "legacy.db", isolation_level=None)
+    for statement in MIGRATIONS[0] + MIGRATIONS[1]:
+      legacy.execute(statement)
+    legacy.execute("INSERT INTO habit (name, description, periodicity, creation_date, creation_time) VALUES ('Legacy', '', 'daily', '2024-01-01', '08:00:00')")
+    legacy.executemany("INSERT INTO tracker (habit_id, completed_date, completed_time) VALUES (1, ?, ?)",
+                       [("2024-01-02", "08:00:00"), ("2024-1-3", "noon"), (None, "08:00:00"), ("2024-13-45", None), ("garbage", None)])
+    legacy.execute("PRAGMA user_version = 2")
+    legacy.close()
+
+    db = HabitDatabase(str(tmp_path / "legacy.db"))
+    assert db.db.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert list(db.db_iter_completions(1)) == [(1, date(2024, 1, 2), time(8)), (1, date(2024, 1, 3), None)]
+    db.db_close()
+
+  def test_no_global_sqlite_adapters(self):
+    # Other connections of the process still bind dates as ISO strings
+    other = sqlite3.connect(":memory:")
+    assert other.execute("SELECT ?", (date(2024, 1, 2),)).fetchone() == ("2024-01-02",)
+    assert "DAY_ORDINAL" not in sqlite3.converters and "DAY_SECONDS" not in sqlite3.converters
+    habit = Habit(name="Ordinals", description="Stored as integers", periodicity="daily", creation_date="2024-01-01", db=self.db)
+    habit.save()
+    habit.record_completion("2024-01-02", "08:00:05")
+    assert self.db.db.execute("SELECT completed_date, completed_time FROM tracker").fetchone() == (date(2024, 1, 2).toordinal(), 8 * 3600 + 5)
+    assert self.db.db_get_completed_dates(habit.habit_id) == [date(2024, 1, 2)]
+    assert list(self.db.db_iter_completions(start=date(2024, 1, 2), end=date(2024, 1, 2))) == [(habit.habit_id, date(2024, 1, 2), time(8, 0, 5))]
+
+  def test_failed_migration_raises(self, tmp_path, monkeypatch):
+    import habit_database
+    monkeypatch.setattr(habit_database, "MIGRATIONS", habit_database.MIGRATIONS + [("SELECT * FROM no_such_table",)])
+    with pytest.raises(sqlite3.OperationalError):
+      HabitDatabase(str(tmp_path / "failed.db"))
+    # The migrations before the failed one are kept
+    assert sqlite3.connect(tmp_path / "failed.db").execute("PRAGMA user_version").fetchone()[0] == len(habit_database.MIGRATIONS) - 1
+
+  def test_incremental_streak(self):
+    today = date.today()
+    for periodicity, step in (("daily", timedelta(days=1)), ("weekly", timedelta(weeks=1)), ("monthly", timedelta(weeks=5))):
+      habit = Habit(name="Incremental", description="Incremental streaks", periodicity=periodicity, db=self.db)
+      habit.save()
+      # In order completions with a gap, followed by a backfill that closes the gap
+      for offset in (6, 5, 3, 2, 1, 0, 4):
+        habit.record_completion(str(today - offset * step), "08:00:00")
+        incremental = (habit.current_streak, habit.last_period, habit.current_run)
+        recalculated = Habit.get_by_id(habit.habit_id, self.db)
+        recalculated.calculate_streak()
+        assert incremental == (recalculated.current_streak, recalculated.last_period, recalculated.current_run)
+      assert habit.current_run >= 4
+
+  def test_recalculate_all_streaks(self):
+    today = date.today()
+    habits = {}
+    for periodicity, step in (("daily", timedelta(days=1)), ("weekly", timedelta(weeks=1)), ("monthly", timedelta(days=31))):
+      habit = Habit(name="Reconcile", description="Streaks in SQL", periodicity=periodicity, db=self.db)
+      habit.save()
+      # Run of 2 up to today and a longer run of 4 in the past
+      Habit.record_completions([(habit.habit_id, str(today - offset * step), None) for offset in (0, 1, 3, 4, 5, 6)], self.db)
+      habits[habit.habit_id] = Habit.get_by_id(habit.habit_id, self.db)
+    Habit(name="Never", description="Never completed", periodicity="daily", db=self.db).save()
+
+    assert self.db.db_recalculate_all_streaks() == 3
+    for habit_id, expected in habits.items():
+      reconciled = Habit.get_by_id(habit_id, self.db)
+      assert reconciled.current_streak == expected.current_streak == 2
+      assert (reconciled.last_period, reconciled.current_run) == (expected.last_period, expected.current_run)
+      assert reconciled.longest_streak == 4
+
+  def test_streak_engine_matches_habit(self):
+    streak_engine = pytest.importorskip("streak_engine")
+    pytest.importorskip("numpy")
+    rng = random.Random(7)
+    today = date.today()
+    habits = []
+    for i in range(30):
+      periodicity = rng.choice(["daily", "weekly", "monthly"])
+      habit = Habit(name=f"Random {i}", description="Property test", periodicity=periodicity, db=self.db)
+      habit.save()
+      span = {"daily": 20, "weekly": 100, "monthly": 300}[periodicity]
+      days = {today - timedelta(days=rng.randrange(span)) for _ in range(rng.randrange(1, 40))}
+      Habit.record_completions([(habit.habit_id, str(day), None) for day in days], self.db)
+      habits.append(habit)
+
+    result = streak_engine.calculate_streaks(*streak_engine.load_completions(self.db))
+    for index, habit in enumerate(habits):
+      # Compare with the calculate_*_streak methods, not with the streaks of the bulk insert
+      habit.calculate_streak()
+      habit.calculate_longest_streak()
+      assert result['habit_id'][index] == habit.habit_id
+      assert result['current_streak'][index] == habit.current_streak
+      assert result['last_period'][index] == habit.last_period
+      assert result['current_run'][index] == habit.current_run
+      assert result['longest_streak'][index] == habit.longest_streak
+
+    # The streaks recalculated in SQL match too
+    self.db.db_recalculate_all_streaks()
+    for habit in habits:
+      reconciled = Habit.get_by_id(habit.habit_id, self.db)
+      assert (reconciled.current_streak, reconciled.longest_streak, reconciled.last_period, reconciled.current_run) == \
+        (habit.current_streak, habit.longest_streak, habit.last_period, habit.current_run)
+
+  def test_streak_stops_at_first_gap(self, monkeypatch):
+    today = date.today()
+    habit = Habit(name="Journal", description="Write a journal entry", periodicity="daily", db=self.db)
+    habit.save()
+    # Five years of history, but the current streak is only three days long
+    history = [today - timedelta(days=offset) for offset in range(3)] + [today - timedelta(days=offset) for offset in range(4, 5 * 365)]
+    Habit.record_completions([(habit.habit_id, str(day), None) for day in history], self.db)
+
+    rows_read = []
+    iter_completed_dates = self.db.db_iter_completed_dates
+    def counting_iter(habit_id, descending=True):
+      for completed_date in iter_completed_dates(habit_id, descending):
+        rows_read.append(completed_date)
+        yield completed_date
+    monkeypatch.setattr(self.db, "db_iter_completed_dates", counting_iter)
+
+    assert habit.calculate_daily_streak() == 3
+    assert len(rows_read) == 4
+
+  def test_backfill_longest_streak(self):
+    today = date.today()
+    habit = Habit(name="Floss", description="Floss teeth", periodicity="daily", db=self.db)
+    habit.save()
+    for offset in (10, 9, 8, 7, 6, 4, 3, 2, 1):
+      habit.record_completion(str(today - timedelta(days=offset)), "21:00:00")
+    assert habit.longest_streak == 5
+
+    habit.record_completion(str(today - timedelta(days=5)), "21:00:00") # Backfill connects both runs
+    assert habit.longest_streak == 10
+    assert habit.current_streak == 0
+    assert self.db.db_recalculate_longest_streaks() == {habit.habit_id: 10}
+
+  def test_streak_as_of(self):
+    today = date.today()
+    habit = Habit(name="Yoga", description="Do yoga", periodicity="daily", db=self.db)
+    habit.save()
+    for offset in (5, 3, 2, 1):
+      habit.record_completion(str(today - timedelta(days=offset)), "07:00:00")
+
+    assert habit.streak_as_of() == 0 # Not completed today
+    assert habit.streak_as_of(today - timedelta(days=1)) == 3
+    assert habit.streak_as_of(today - timedelta(days=2)) == 2 # Historical evaluation
+    assert habit.streak_as_of(today - timedelta(days=4)) == 0
+    assert habit.streak_as_of(today - timedelta(days=2)) == 2 # Cached
+
+    habit.record_completion(completed_time="07:00:00")
+    assert habit.streak_as_of() == 4 # Cache is invalidated by the new completion
+
+  def test_monthly_streak_as_of(self):
+    habit = Habit(name="Budget", description="Review the budget", periodicity="monthly", creation_date="2024-01-01", db=self.db)
+    habit.save()
+    Habit.record_completions([(habit.habit_id, day, None) for day in ("2024-01-10", "2024-02-10", "2024-03-10")], self.db)
+
+    # Current during the last completed month and the month after, stale once a month was missed
+    expected = {date(2024, 3, 31): 3, date(2024, 4, 30): 3, date(2024, 5, 1): 0, date(2025, 1, 1): 0}
+    for as_of, streak in expected.items():
+      assert habit.streak_as_of(as_of) == streak
+      self.db.db_recalculate_all_streaks(as_of)
+      assert Habit.get_by_id(habit.habit_id, self.db).current_streak == streak
+    streak_engine = pytest.importorskip("streak_engine")
+    pytest.importorskip("numpy")
+    for as_of, streak in expected.items():
+      assert streak_engine.calculate_streaks(*streak_engine.load_completions(self.db), as_of=as_of)['current_streak'].tolist() == [streak]
+
+  def test_streak_as_of_inside_last_period(self):
+    monthly = Habit(name="Taxes", description="File receipts", periodicity="monthly", creation_date="2024-01-01", db=self.db)
+    monthly.save()
+    weekly = Habit(name="Laundry", description="Wash clothes", periodicity="weekly", creation_date="2024-01-01", db=self.db)
+    weekly.save()
+    # Wednesday 2024-03-20 is the only completion of both habits
+    Habit.record_completions([(monthly.habit_id, "2024-03-20", None), (weekly.habit_id, "2024-03-20", None)], self.db)
+
+    for habit in (monthly, weekly):
+      record = Habit.get_by_id(habit.habit_id, self.db)
+      assert record.streak_as_of(date(2024, 3, 18)) == 0 # Same period, before the completion
+      assert record.streak_as_of(date(2024, 3, 20)) == 1
+      assert record.streak_as_of(date(2024, 3, 21)) == 1
+    for record in Habit.iter_records(self.db):
+      assert record.streak_as_of(date(2024, 3, 18)) == 0
+      assert record.streak_as_of(date(2024, 3, 22)) == 1
+
+  def test_completion_bitmap(self):
+    today = date.today()
+    habit = Habit(name="Piano", description="Practice piano", periodicity="daily", creation_date=str(today - timedelta(days=20)), db=self.db)
+    habit.save()
+    offsets = (30, 12, 11, 10, 9, 2, 1, 0) # first completion lies before the creation date
+    for offset in offsets:
+      habit.record_completion(str(today - timedelta(days=offset)), "18:00:00")
+
+    bitmap = self.db.db_get_completion_bitmap(habit.habit_id)
+    assert today - timedelta(days=30) in bitmap
+    assert today - timedelta(days=3) not in bitmap
+    assert len(bitmap) == len(offsets)
+    assert bitmap.count(today - timedelta(days=11), today - timedelta(days=1)) == 5
+    assert bitmap.run_ending_at(today) == 3
+    assert bitmap.longest_run() == 4
+    assert bitmap.last_completed() == today
+    assert list(bitmap.days()) == self.db.db_get_completed_dates(habit.habit_id)
+
+    # The maintained bitmap matches a rebuild from the tracker table
+    self.db.db_rebuild_completion_bitmaps()
+    rebuilt = self.db.db_get_completion_bitmaps()[habit.habit_id]
+    assert (rebuilt.origin, rebuilt.bits) == (bitmap.origin, bitmap.bits)
+
+  def test_completion_rates(self):
+    today = date.today()
+    daily = Habit(name="Water", description="Drink water", periodicity="daily", creation_date=str(today - timedelta(days=100)), db=self.db)
+    daily.save()
+    new = Habit(name="New", description="Created three days ago", periodicity="daily", creation_date=str(today - timedelta(days=3)), db=self.db)
+    new.save()
+    Habit.record_completions([(daily.habit_id, str(today - timedelta(days=offset)), None) for offset in range(0, 60, 2)], self.db)
+    Habit.record_completions([(new.habit_id, str(today - timedelta(days=offset)), None) for offset in range(2)], self.db)
+
+    habits = Habit.get_all_habits(self.db)
+    rates, overall = analysis.a1_completion_rates(habits, self.db.db_iter_completions(), as_of=today)
+    assert rates[daily.habit_id][7] == 4 / 7
+    assert rates[daily.habit_id][90] == 30 / 90
+    assert rates[daily.habit_id][365] == 30 / 101 # Window starts with the creation date
+    assert rates[new.habit_id][7] == 2 / 4
+    assert overall[7] == 6 / 11
+    analysis.a1_print_completion_rates(habits, rates, overall)
+
+  def test_completion_rates_ignore_old_history(self, monkeypatch):
+    today = date.today()
+    habit = Habit(name="Floss", description="Floss teeth", periodicity="daily", creation_date=str(today - timedelta(days=20 * 365)), db=self.db)
+    habit.save()
+    Habit.record_completions([(habit.habit_id, str(today - timedelta(days=offset)), None) for offset in list(range(15 * 365, 15 * 365 + 50)) + [400, 364, 0]], self.db)
+
+    # The cumulative count only spans the longest window, not twenty years
+    prefix_lengths = []
+    accumulate = analysis.accumulate
+    def counting_accumulate(iterable):
+      prefix = list(accumulate(iterable))
+      prefix_lengths.append(len(prefix))
+      return prefix
+    monkeypatch.setattr(analysis, "accumulate", counting_accumulate)
+
+    rates, overall = analysis.a1_completion_rates(Habit.get_all_habits(self.db), self.db.db_iter_completions(), as_of=today)
+    assert prefix_lengths == [365]
+    assert rates[habit.habit_id] == {7: 1 / 7, 30: 1 / 30, 90: 1 / 90, 365: 2 / 365}
+
+  def test_top_habits(self):
+    for name, streak in (("A", 3), ("B", 7), ("C", 7), ("D", 1), ("E", 1)):
+      habit = Habit(name=name, description="Top k", periodicity="daily", db=self.db)
+      habit.save()
+      self.db.db_update_streak(habit.habit_id, longest_streak=streak)
+
+    assert [habit.name for habit in Habit.get_top_habits(1, db=self.db)] == ["B", "C"] # Ties are included
+    assert [habit.name for habit in Habit.get_top_habits(3, db=self.db)] == ["B", "C", "A"]
+    assert [habit.name for habit in Habit.get_bottom_habits(1, db=self.db)] == ["D", "E"]
+    assert len(Habit.get_top_habits(10, db=self.db)) == 5
+    assert "idx_habit_longest_streak" in self.db.db.execute(
+      "EXPLAIN QUERY PLAN SELECT * FROM habit ORDER BY longest_streak DESC LIMIT 1").fetchall()[0][3]
+
+  def test_habits_by_periodicity(self):
+    for name, periodicity in (("Run", "weekly"), ("Read", "daily"), ("Swim", "weekly")):
+      Habit(name=name, description="Periodicity filter", periodicity=periodicity, db=self.db).save()
+
+    assert [habit.name for habit in Habit.get_by_periodicity("weekly", self.db)] == ["Run", "Swim"]
+    assert self.db.db_get_habits_by_periodicity("daily", columns=("id", "name")) == [(2, "Read")]
+    with pytest.raises(ValueError):
+      self.db.db_get_habits_by_periodicity("daily", columns=("name; DROP TABLE habit",))
+
+  def test_habit_records(self):
+    today = date.today()
+    habit = Habit(name="Walk", description="Records", periodicity="daily", creation_date=str(today - timedelta(days=10)), db=self.db)
+    habit.save()
+    Habit.record_completions([(habit.habit_id, str(today - timedelta(days=offset)), None) for offset in range(3)], self.db)
+
+    record, = Habit.get_all_records(self.db)
+    assert isinstance(record, HabitRecord)
+    assert (record.name, record.periodicity, record.longest_streak) == ("Walk", "daily", 3)
+    assert record.streak_as_of(today) == 3
+    assert record.streak_as_of(today + timedelta(days=2)) == 0
+    assert record.streak_as_of(today - timedelta(days=1), self.db) == 2 # Read from the history
+
+    full = record.to_habit(self.db)
+    full.update(description="Changed")
+    assert Habit.get_by_id(habit.habit_id, self.db).description == "Changed"
+
+  def test_habit_records_use_their_database(self, monkeypatch):
+    today = date.today()
+    habit = Habit(name="Swim", description="Records", periodicity="weekly", db=self.db)
+    habit.save()
+    Habit.record_completions([(habit.habit_id, str(today), None)], self.db)
+    habit.update(periodicity="daily") # Streak data is unknown until it is recalculated
+
+    def no_shared_database(*args):
+      raise AssertionError("The shared database was opened")
+    monkeypatch.setattr(HabitDatabase, "shared", no_shared_database)
+    record, = Habit.iter_records(self.db)
+    assert record.last_period is None and record.db is self.db
+    assert record.streak_as_of(today) == 1 # History read from the database of the record
+    assert record.to_habit().db is self.db
+    analysis.a1_print_all_habits(Habit.iter_records(self.db))
+
+    with pytest.raises(ValueError):
+      HabitRecord(*self.db.db_get_habit_by_id(habit.habit_id)).to_habit() # Database unknown
+
+  def test_habit_identity_map(self):
+    habit = Habit(name="Stretch", description="Cached", periodicity="daily", db=self.db)
+    habit.save()
+    cached = Habit.get_by_id(habit.habit_id, self.db)
+
+    queries = []
+    self.db.db.set_trace_callback(queries.append)
+    assert Habit.get_by_id(habit.habit_id, self.db) is cached # Served from memory
+    self.db.db.set_trace_callback(None)
+    assert queries == ["PRAGMA data_version"] # Only the check for changes of other connections
+
+    # Writes of another connection or process replace the cached habit
+    other = sqlite3.connect("test.db")
+    other.execute("UPDATE habit SET description = 'Elsewhere' WHERE id = ?", (habit.habit_id,))
+    other.commit()
+    other.close()
+    assert Habit.get_by_id(habit.habit_id, self.db).description == "Elsewhere"
+
+    cached.record_completion()
+    assert Habit.get_by_id(habit.habit_id, self.db).current_streak == 1
+    cached.update(description="Changed")
+    assert Habit.get_by_id(habit.habit_id, self.db).description == "Changed"
+
+    with pytest.raises(ValueError):
+      with self.db.transaction():
+        self.db.db_update(habit.habit_id, description="Rolled back")
+        Habit.get_by_id(habit.habit_id, self.db)
+        raise ValueError("abort")
+    assert Habit.get_by_id(habit.habit_id, self.db).description == "Changed"
+
+    Habit.delete_habit(habit.habit_id, self.db)
+    with pytest.raises(ValueError):
+      Habit.get_by_id(habit.habit_id, self.db)
+
+  def test_streaming_habits_and_completions(self):
+    today = date.today()
+    habits = []
+    for name in ("A", "B", "C"):
+      habit = Habit(name=name, description="Stream", periodicity="daily", creation_date=str(today - timedelta(days=9)), db=self.db)
+      habit.save()
+      habits.append(habit)
+    Habit.record_completions([(habit.habit_id, str(today - timedelta(days=offset)), None) for habit in habits[::2] for offset in range(5)], self.db)
+
+    stream = self.db.db_iter_habits(batch_size=2)
+    assert not isinstance(stream, list)
+    assert [row[1] for row in stream] == ["A", "B", "C"]
+    assert [habit.name for habit in Habit.iter_habits(self.db)] == ["A", "B", "C"]
+    assert len(list(self.db.db_iter_completions(batch_size=3))) == 10
+
+    # Analysis functions take generators
+    rates, overall = analysis.a1_completion_rates(Habit.iter_records(self.db), self.db.db_iter_completions(batch_size=3), as_of=today)
+    assert rates[habits[0].habit_id][7] == 5 / 7
+    assert rates[habits[1].habit_id][7] == 0
+    assert overall[7] == 10 / 21
+    analysis.a1_print_all_habits(habit for habit in ())
+    analysis.a1_print_best_perfroming_habit(Habit.iter_records(self.db))
+
+  def test_habit_pages(self):
+    for name in ("Run", "Read", "Row", "R_x", "Rax", "Swim"):
+      Habit(name=name, description="Pages", periodicity="daily", db=self.db).save()
+
+    first = self.db.db_get_habit_page(limit=4, columns=("id", "name"))
+    assert [name for _, name in first] == ["Run", "Read", "Row", "R_x"]
+    second = self.db.db_get_habit_page(first[-1][0], limit=4, columns=("id", "name"))
+    assert [name for _, name in second] == ["Rax", "Swim"]
+    assert self.db.db_get_habit_page(second[-1][0], limit=4) == []
+
+    assert [row[1] for row in self.db.db_get_habit_page(name_prefix="r")] == ["Run", "Read", "Row", "R_x", "Rax"]
+    assert [row[1] for row in self.db.db_get_habit_page(name_prefix="R_")] == ["R_x"] # _ is no wildcard
+    Habit(name="Rest", description="Pages", periodicity="weekly", db=self.db).save()
+    assert [row[1] for row in self.db.db_get_habit_page(name_prefix="r", periodicity="weekly")] == ["Rest"]
+    assert [row[1] for row in self.db.db_get_habit_page(limit=2, periodicity="daily")] == ["Run", "Read"]
+    plan = self.db.db.execute("EXPLAIN QUERY PLAN SELECT id FROM habit WHERE id > 100 ORDER BY id LIMIT 20").fetchall()
+    assert "PRIMARY KEY" in plan[0][3]
+
+  def test_habit_session_cache(self):
+    for name in ("Run", "Read"):
+      Habit(name=name, description="Session", periodicity="daily", db=self.db).save()
+    session = HabitSessionCache(self.db, lambda row: HabitRecord(*row, self.db))
+    assert [habit.name for habit in session.habits()] == ["Run", "Read"]
+
+    queries = []
+    self.db.db.set_trace_callback(queries.append)
+    session.habits()
+    self.db.db.set_trace_callback(None)
+    assert not any("FROM habit" in query for query in queries) # Only the data version was read
+
+    habit = Habit.get_by_id(1, self.db)
+    habit.record_completion()
+    session.invalidate(habit.habit_id)
+    assert session.get(1).current_streak == 1
+    assert session.get(2).name == "Read"
+
+    # Changes of other connections are detected
+    other = HabitDatabase("test.db")
+    Habit(name="Swim", description="Other process", periodicity="weekly", db=other).save()
+    other.db_close()
+    assert [habit.name for habit in session.habits()] == ["Run", "Read", "Swim"]
+    Habit.delete_habit(3, self.db)
+    session.invalidate(3)
+    assert len(session) == 2
+
+  def test_cli_help_does_not_open_database(self):
+    from click.testing import CliRunner
+    import cli
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+      assert runner.invoke(cli.cli, ["--help"]).exit_code == 0
+      assert runner.invoke(cli.cli, ["main-menu", "--help"]).exit_code == 0
+      assert runner.invoke(cli.cli, ["main-menu", "--no-such-option"]).exit_code == 2
+      assert not os.path.exists("main.db")
+    assert cli.db is None
+
+  def test_cli_batch_commands(self, monkeypatch):
+    from click.testing import CliRunner
+    import cli
+    import json
+    monkeypatch.setattr(cli, "db", None) # Restored after the test, the commands open test.db
+    runner = CliRunner(mix_stderr=False)
+    today = date.today()
+
+    records = '{"name": "Run", "periodicity": "daily"}\n{"name": "Read", "periodicity": "weekly", "description": "Books"}\n'
+    result = runner.invoke(cli.cli, ["--db", "test.db", "add", "--file", "-"], input=records)
+    assert json.loads(result.output) == {"added": [{"id": 1, "name": "Run", "periodicity": "daily"}, {"id": 2, "name": "Read", "periodicity": "weekly"}]}
+
+    completions = "".join(f'{{"habit_id": 1, "completed_date": "{today - timedelta(days=offset)}"}}\n' for offset in range(3))
+    result = runner.invoke(cli.cli, ["--db", "test.db", "complete", "--file", "-"], input=completions)
+    assert json.loads(result.output) == {"recorded": 3, "skipped": 0}
+    result = runner.invoke(cli.cli, ["--db", "test.db", "complete", "1", "2"])
+    assert json.loads(result.output) == {"recorded": 1, "skipped": 1}
+
+    # A bad record rolls back the whole batch
+    result = runner.invoke(cli.cli, ["--db", "test.db", "add", "--file", "-"], input='{"name": "Swim", "periodicity": "daily"}\n{"name": "Run", "periodicity": "daily"}\n')
+    assert result.exit_code == 1 and result.output == ""
+    assert not Habit.is_duplicate("Swim", "daily", self.db)
+
+    # Creation dates and times are validated and zero padded
+    for bad in ('"creation_date": "2024-02-30"', f'"creation_date": "{today + timedelta(days=1)}"', '"creation_time": "8 am"', '"creation_date": 20240101'):
+      result = runner.invoke(cli.cli, ["--db", "test.db", "add", "--file", "-"], input=f'{{"name": "Swim", "periodicity": "daily", {bad}}}\n')
+      assert result.exit_code == 1 and "Invalid creation date or time of habit 1" in result.stderr
+    # Fields of other types than text are reported per record instead of failing in the database
+    for field, bad in (("description", '"description": null'), ("name", '"name": 42'), ("periodicity", '"periodicity": ["daily"]')):
+      result = runner.invoke(cli.cli, ["--db", "test.db", "add", "--file", "-"], input=f'{{"name": "Swim", "periodicity": "daily"}}\n{{"name": "Swim", "periodicity": "weekly", {bad}}}\n')
+      assert result.exit_code == 1 and f"Invalid {field} of habit 2" in result.stderr
+      assert not Habit.is_duplicate("Swim", "daily", self.db)
+    result = runner.invoke(cli.cli, ["--db", "test.db", "add", "--file", "-"], input='{"name": "Swim", "periodicity": "daily", "creation_date": "2024-1-2", "creation_time": "8:05:00"}\n')
+    swim = Habit.get_by_id(json.loads(result.output)["added"][0]["id"], self.db)
+    assert (swim.creation_date, swim.creation_time) == ("2024-01-02", "08:05:00")
+    Habit.delete_habit(swim.habit_id, self.db)
+
+    runner.invoke(cli.cli, ["--db", "test.db", "update", "2", "--description", "Papers"])
+    habits = [json.loads(line) for line in runner.invoke(cli.cli, ["--db", "test.db", "list"]).output.splitlines()]
+    assert [(habit["name"], habit["description"]) for habit in habits] == [("Run", ""), ("Read", "Papers")]
+    habits = [json.loads(line) for line in runner.invoke(cli.cli, ["--db", "test.db", "list", "--periodicity", "weekly"]).output.splitlines()]
+    assert [habit["name"] for habit in habits] == ["Read"]
+
+    report = json.loads(runner.invoke(cli.cli, ["--db", "test.db", "report", "1"]).output)
+    assert report["habits"][0]["current_streak"] == 3
+    assert report["habits"][0]["completion_rates"]["7"] == 1.0
+
+    assert json.loads(runner.invoke(cli.cli, ["--db", "test.db", "delete", "1", "2"]).output) == {"deleted": [1, 2]}
+    assert Habit.get_all_habits(self.db) == []
+
+  def test_import_resumes_from_checkpoint(self):
+    today = date.today()
+    records = [{"id": "h1", "name": "Run", "periodicity": "daily", "creation_date": str(today - timedelta(days=30))}]
+    records += [{"habit_id": "h1", "completed_date": f"{day.year}-{day.month}-{day.day}"} for day in (today - timedelta(days=offset) for offset in range(20))]
+
+    def interrupted(records, after):
+      for number, record in enumerate(records):
+        if number == after:
+          raise KeyboardInterrupt
+        yield record
+
+    with pytest.raises(KeyboardInterrupt):
+      habit_import.import_records(self.db, interrupted(records, 13), "other app", batch_size=5)
+    assert self.db.db_get_import_checkpoint("other app") == 10 # The interrupted batch was rolled back
+    assert len(self.db.db_get_completed_dates(1)) == 9
+
+    stats = habit_import.import_records(self.db, iter(records), "other app", batch_size=5)
+    assert (stats["resumed_at"], stats["completions"], stats["position"]) == (10, 11, 21)
+    habit = Habit.get_by_id(1, self.db)
+    assert habit.longest_streak == 20 and habit.current_streak == 20
+
+    with pytest.raises(ValueError):
+      habit_import.import_records(self.db, iter([{"habit_id": "h1", "completed_date": "2024-02-30"}]), "broken")
+    assert self.db.db_get_import_checkpoint("broken") == 0
+
+    # Ids are not resolved as local habit ids, habit 1 exists but was not imported by this source
+    with pytest.raises(ValueError, match="Unknown habit id 1"):
+      habit_import.import_records(self.db, iter([{"habit_id": "1", "completed_date": str(today)}]), "unmapped")
+    assert self.db.db_get_import_checkpoint("unmapped") == 0
+
+  def test_import_csv_file(self, tmp_path):
+    path = tmp_path / "habits.csv"
+    path.write_text(
+      "id,name,periodicity,habit_id,completed_date\n"
+      "7,Read,weekly,,\n"
+      ",,,7,2024-1-2\n"
+      ",,,7,2024-01-02\n"
+      )
+    # Streak state of a habit the import doesn't touch is left as it is
+    Habit(name="Other", description="Not imported", periodicity="daily", db=self.db).save()
+    self.db.db.execute("UPDATE habit SET current_streak = 5 WHERE name = 'Other'")
+    stats = habit_import.import_file(self.db, str(path))
+    assert (stats["habits"], stats["completions"], stats["existing_habits"], stats["duplicate_completions"]) == (1, 1, 0, 1)
+    assert Habit.get_by_id(self.db.db_get_habit_id("Other", "daily"), self.db).current_streak == 5
+    assert stats["source"] == f"{path}:{path.stat().st_size}:{path.stat().st_mtime_ns}"
+    assert self.db.db_get_completed_dates(self.db.db_get_habit_id("Read", "weekly")) == [date(2024, 1, 2)]
+
+    # Another file with the same name doesn't resume the checkpoint of the first one
+    other = tmp_path / "other" / "habits.csv"
+    other.parent.mkdir()
+    other.write_text("id,name,periodicity\n8,Write,daily\n")
+    stats = habit_import.import_file(self.db, str(other))
+    assert (stats["resumed_at"], stats["habits"]) == (0, 1)
+
+    # Running it again under another name reuses the habit and skips both completion records
+    stats = habit_import.import_file(self.db, str(path), source="again")
+    assert (stats["habits"], stats["completions"], stats["existing_habits"], stats["duplicate_completions"]) == (0, 0, 1, 2)
+
+  def test_export(self, tmp_path):
+    today = date.today()
+    for name, periodicity in (("Run", "daily"), ("Read", "weekly")):
+      Habit(name=name, description="Export", periodicity=periodicity, db=self.db).save()
+    Habit.record_completions([(1, str(today - timedelta(days=offset)), "07:30:00") for offset in range(4)] + [(2, str(today), None)], self.db)
+
+    assert habit_export.export_all(self.db, str(tmp_path / "csv")) == {"habits": 2, "completions": 5}
+    with open(tmp_path / "csv" / "habits.csv") as file:
+      assert file.readline().strip() == ",".join(habit_export.HABIT_COLUMNS)
+      assert file.readline().startswith("1,Run,Export,daily,")
+
+    path = str(tmp_path / "completions.jsonl")
+    assert habit_export.export_completions(self.db, path, "jsonl", periodicity="daily", start=today - timedelta(days=1)) == 2
+    with open(path) as file:
+      assert [json.loads(line)["completed_date"] for line in file] == [str(today - timedelta(days=1)), str(today)]
+
+    np = pytest.importorskip("numpy")
+    habit_export.export_all(self.db, str(tmp_path / "npy"), "npy", habit_ids=[1])
+    assert np.load(tmp_path / "npy" / "habits" / "name.npy").tolist() == ["Run"]
+    assert np.load(tmp_path / "npy" / "habits" / "current_streak.npy").tolist() == [4]
+    dates = np.load(tmp_path / "npy" / "completions" / "completed_date.npy")
+    assert dates.dtype == np.dtype("datetime64[D]") and dates[-1] == np.datetime64(str(today))
+    assert np.load(tmp_path / "npy" / "completions" / "completed_time.npy")[0] == np.timedelta64(27000, "s")
+
+  def test_cli_menu_uses_db_option(self, monkeypatch):
+    from click.testing import CliRunner
+    import cli
+    monkeypatch.setattr(cli, "db", None)
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+      steps = [
+        "1", "Run", "daily", "Running", "y", "Read", "weekly", "Books", "n", # add two habits
+        "5", "1", "", "2", "", "3", "", "9", # best, worst and all habits
+        "4", "1", "n", # delete the first habit
+        "6",
+        ]
+      result = runner.invoke(cli.cli, ["--db", "x.db", "main-menu"], input="\n".join(steps) + "\n")
+      assert result.exit_code == 0, result.output
+      assert "'Read' with a streak of 0" in result.output
+      other = HabitDatabase("x.db")
+      assert [habit.name for habit in Habit.get_all_habits(other)] == ["Read"]
+      other.db_close()
+      assert not os.path.exists("main.db")